@@ -22,33 +22,30 @@ SCALE_MIN = 0.3
 SCALE_MAX = 3.0
 ROTATE_STEP = 5
 MOVE_STEP = 5
-X_MAX = SCREENSIZE - (BALL_COLS + 1) * BALL_SIZE
-Y_MAX = SCREENSIZE - (BALL_ROWS + 1) * BALL_SIZE
 
 colors = {
     "background": pygame.Color(225, 225, 225)
 }
 
 
+# images are loaded once and packed into shared sheets
+atlas = TextureAtlas()
+
+
 def load_image(name, colorkey=None):
     fullname = os.path.join(data_dir, name)
     try:
-        image = pygame.image.load(fullname)
+        image = atlas.load(fullname, colorkey)
     except pygame.error:
         print ("Cannot load image:", fullname)
         raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
     return image
 
 
 class Ball(Sprite):
-    def __init__(self):
+    def __init__(self, image):
         Sprite.__init__(self)
-        self.set_image(load_image("ball.png", -1))
+        self.set_image(image)
         self.anchor = ANCHOR_CENTER
 
 
@@ -59,6 +56,7 @@ def main():
     rotate_keys = [pygame.K_a, pygame.K_s]
     scale_keys = [pygame.K_z, pygame.K_x]
     visibility_keys = [pygame.K_SPACE]
+    flatten_keys = [pygame.K_f]
     left_keys = [pygame.K_LEFT, pygame.K_RIGHT]
     top_keys = [pygame.K_UP, pygame.K_DOWN]
     quit_keys = [pygame.K_ESCAPE, pygame.K_q]
@@ -68,12 +66,19 @@ def main():
     background = background.convert()
     background.fill(colors["background"])
 
-    # add ball sprite
+    # balls share one image, so they also share its transformed copies
+    Sprite.transform_cache = TransformCache(angle_step=ROTATE_STEP)
+    ball_image = load_image("ball.png", -1)
+
+    # add ball sprites around the formation's center, which it is
+    # scaled and rotated around
     balls = AggregatedSprite()
+    balls.move_to(screen.get_rect().center)
     for i in range(0, BALL_COLS):
         for j in range(0, BALL_ROWS):
-            b = Ball()
-            b.move_to((BALL_SIZE + i * BALL_SIZE, BALL_SIZE + j * BALL_SIZE))
+            b = Ball(ball_image)
+            b.move_to(((i - (BALL_COLS - 1) / 2.0) * BALL_SIZE,
+                       (j - (BALL_ROWS - 1) / 2.0) * BALL_SIZE))
             balls.add_sprite(b)
     all = RenderPlain((balls))
 
@@ -112,6 +117,11 @@ def main():
                         top = 0
                     elif event.key in visibility_keys:
                         balls.toggle_visibility()
+                    elif event.key in flatten_keys:
+                        if balls.flattened:
+                            balls.unflatten()
+                        else:
+                            balls.flatten()
                     elif event.key in quit_keys:
                         return
 
@@ -126,13 +136,8 @@ def main():
             if left != 0 or top != 0:
                 x = left * MOVE_STEP
                 y = top * MOVE_STEP
-                # balls.move_by((x, y))
-                (new_x, new_y) = balls.position
-                new_x += x
-                new_y += y
-                if 0 <= new_x < X_MAX:
-                    if 0 <= new_y < Y_MAX:
-                        balls.move_to((new_x, new_y))
+                if screen.get_rect().contains(balls.rect.move(x, y)):
+                    balls.move_by((x, y))
 
             all.clear(screen, background)
             all.update()
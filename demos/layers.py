@@ -20,18 +20,17 @@ colors = {
 }
 
 
+# images are loaded once and packed into shared sheets
+atlas = TextureAtlas()
+
+
 def load_image(name, colorkey=None):
     fullname = os.path.join(data_dir, name)
     try:
-        image = pygame.image.load(fullname)
+        image = atlas.load(fullname, colorkey)
     except pygame.error:
         print ("Cannot load image:", fullname)
         raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
     return image, image.get_rect()
 
 
@@ -84,8 +83,6 @@ def main():
                             ball.layer = 3
                             button.layer = 1
                             teddy.layer = 2
-                        all.remove((ball, button, teddy))
-                        all.add((ball, button, teddy))
                     elif event.key in quit_keys:  # quit game
                         return
 
@@ -27,18 +27,17 @@ colors = {
 }
 
 
+# images are loaded once and packed into shared sheets
+atlas = TextureAtlas()
+
+
 def load_image(name, colorkey=None):
     fullname = os.path.join(data_dir, name)
     try:
-        image = pygame.image.load(fullname)
+        image = atlas.load(fullname, colorkey)
     except pygame.error:
         print ("Cannot load image:", fullname)
         raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
     return image
 
 
@@ -76,13 +75,19 @@ class Ball(Sprite):
         self.move_to(self.regions[self.current_region])
 
 
-def print_labels(screen, regions):
+class Label(Sprite):
+    def __init__(self, font, pos):
+        Sprite.__init__(self)
+        (x, y) = pos
+        self.set_image(font.render("{0},{1}".format(x, y), 1,
+                                   colors["point"]))
+        self.anchor = ANCHOR_CENTER
+        self.move_to(pos)
+
+
+def make_labels(regions):
     font = pygame.font.Font(None, 14)
-    for x, y in regions:
-        if x > 0 and y > 0:  # labels
-            text = font.render("{0},{1}".format(x, y), 1, colors["point"])
-            textpos = text.get_rect(centerx=x, centery=y)
-            screen.blit(text, textpos)
+    return [Label(font, (x, y)) for x, y in regions if x > 0 and y > 0]
 
 
 def main():
@@ -106,9 +111,13 @@ def main():
             x = j * REGIONSROWIZE
             regions.append((x, y))
 
-    # add ball sprite
+    # add ball sprite above the labels, which never change and are kept
+    # in the group's cached background instead of being drawn every frame
     ball = Ball(regions)
-    all = pygame.sprite.RenderPlain((ball))
+    ball.layer = 1
+    all = RenderPlain(ball, make_labels(regions))
+    all.set_static_layer(0)
+    screen.blit(all.background(screen, background), (0, 0))
 
     try:
         while 1:
@@ -126,10 +135,6 @@ def main():
 
             all.clear(screen, background)
             all.update()
-
-            screen.blit(background, (0, 0))
-            print_labels(screen, regions)
-
             all.draw(screen)
             pygame.display.flip()
             clock.tick(40)
@@ -26,18 +26,17 @@ colors = {
 }
 
 
+# images are loaded once and packed into shared sheets
+atlas = TextureAtlas()
+
+
 def load_image(name, colorkey=None):
     fullname = os.path.join(data_dir, name)
     try:
-        image = pygame.image.load(fullname)
+        image = atlas.load(fullname, colorkey)
     except pygame.error:
         print ("Cannot load image:", fullname)
         raise SystemExit(str(geterror()))
-    image = image.convert()
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image.get_at((0, 0))
-        image.set_colorkey(colorkey, RLEACCEL)
     return image
 
 
@@ -79,11 +78,17 @@ def main():
     background = pygame.Surface(screen.get_size(), pygame.SRCALPHA, 32)
     background = background.convert()
     background.fill(colors["background"])
+    draw_squares(background)
+    screen.blit(background, (0, 0))
+    pygame.display.flip()
 
-    # add ball sprite
+    # add ball sprite; its rotation frames are computed in the background
+    # while the demo starts
+    Sprite.transform_cache = TransformCache(scale_step=SCALE_STEP)
     ball = Ball()
+    Sprite.transform_cache.bake(ball.original, frames=360 // ROTATE_STEP)
     ball.move_to(SCREEN_CENTER)
-    all = Group((ball))
+    all = DirtyGroup((ball))
 
     scale, rotate = 0, 0
     try:
@@ -126,11 +131,7 @@ def main():
             all.clear(screen, background)
             all.update()
 
-            screen.blit(background, (0, 0))
-            draw_squares(screen)
-
-            all.draw(screen)
-            pygame.display.flip()
+            pygame.display.update(all.draw(screen))
             clock.tick(40)
     finally:
         pygame.quit()
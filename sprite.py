@@ -1,6 +1,28 @@
 import pygame
+import os
+import sys
+import json
+import math
+import threading
+import itertools
 from operator import truth
 from functools import wraps
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right, insort
+from heapq import heappush, heappop
+from collections import OrderedDict, deque
+from weakref import WeakKeyDictionary
+from timeit import default_timer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 
 
 # Flag values for anchors.
@@ -16,6 +38,18 @@ ANCHOR_MIDLEFT = 108
 ANCHOR_MIDRIGHT = 109
 
 
+# Flag values for updates deferred while a sprite is batching.
+_PENDING_IMAGE = 1
+_PENDING_POSITION = 2
+_PENDING_NOTIFY = 4
+_PENDING_APPLYING = 8
+_PENDING_SHAPE = _PENDING_IMAGE | _PENDING_POSITION
+
+# Increasing numbers, ordering sprites that entered a layer and breaking
+# ties in the wakeup heaps, as sprites cannot be compared
+_sequence = itertools.count()
+
+
 def call_hook_method(hook_name):
     """decorator to wrap a method with a call to a hook method.
 
@@ -32,27 +66,713 @@ def call_hook_method(hook_name):
     return on_call
 
 
-class Sprite(object):
-    """simple base class for visible game objects
+def transform_image(original, scale, rotate):
+    """return a scaled and then rotated copy of an image
 
-    pygame.sprite.Sprite(*groups): return Sprite
+    transform_image(Surface, scale, rotate): return Surface
 
-    The base class for visible game objects. Derived classes will want to
-    override the Sprite.update() method and assign Sprite.image and Sprite.rect
-    attributes.  The initializer can accept any number of Group instances that
-    the Sprite will become a member of.
+    The original image is returned as-is when no transformation is needed.
+    """
+    img = original
+    if scale != 1:
+        (width, height) = original.get_size()
+        img = pygame.transform.scale(
+            img, ((int)(width * scale), (int)(height * scale)))
+    if rotate != 0:
+        img = pygame.transform.rotate(img, rotate)
+    return img
 
-    When subclassing the Sprite class, be sure to call the base initializer
-    before adding the Sprite to Groups.
+
+def _rotate_vector(x, y, degree):
+    """rotate a vector the way pygame.transform.rotate turns an image
+
+    Right angles are handled exactly, so that positions do not drift.
+    """
+    degree %= 360
+    if degree == 0:
+        return (x, y)
+    elif degree == 90:
+        return (y, -x)
+    elif degree == 180:
+        return (-x, -y)
+    elif degree == 270:
+        return (-y, x)
+    rad = math.radians(degree)
+    (cos, sin) = (math.cos(rad), math.sin(rad))
+    return (x * cos + y * sin, y * cos - x * sin)
+
+
+# masks computed by image_mask, living as long as their image
+_image_masks = WeakKeyDictionary()
+
+
+def image_mask(image):
+    """return the collision mask of an image
+
+    image_mask(Surface): return Mask
+
+    The mask is computed on first use and cached with the image, so it is
+    only rebuilt for new images, such as the ones update_image produces.
+    Images shared through a TransformCache share their mask too. Drawing
+    on an image after its mask was computed is not noticed.
+    """
+    mask = _image_masks.get(image)
+    if mask is None:
+        mask = _image_masks[image] = pygame.mask.from_surface(image)
+    return mask
+
+
+class TransformCache(object):
+    """shared cache of transformed sprite images
+
+    TransformCache(max_bytes, angle_step, scale_step): return TransformCache
+
+    Keeps the images produced by transform_image, keyed on the original
+    surface, the scale ratio and the rotation. Sprites sharing an original
+    image also share its transformed copies. To use a single cache for the
+    whole process assign it to the Sprite class:
+
+        Sprite.transform_cache = TransformCache()
+
+    When angle_step or scale_step are given, rotations and scale ratios
+    are snapped to multiples of them, which trades some precision for a
+    higher hit rate. The least recently used images are evicted once the
+    cached pixel data grows over max_bytes.
+
+    For images that rotate all the time, TransformCache.bake computes a
+    bank of rotation frames ahead of time, in background threads. The
+    rotations of a baked image are snapped to its frames, which are never
+    evicted.
+
+    Cached images are shared, so they must not be drawn on.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024,
+                 angle_step=None, scale_step=None):
+        self.max_bytes = max_bytes
+        self.angle_step = angle_step
+        self.scale_step = scale_step
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._banks = {}  # original -> (angle step, {(scale, rotate): image})
+        self._executor = None
+
+    def quantize(self, scale, rotate):
+        """snap a scale ratio and rotation to the cache's steps
+        """
+        if self.scale_step:
+            step = self.scale_step
+            scale = max(round(scale / step), 1) * step
+        if self.angle_step:
+            step = self.angle_step
+            rotate = (round(rotate / step) * step) % 360
+        return (scale, rotate)
+
+    def get(self, original, scale, rotate):
+        """return the transformed image, computing it on a miss
+
+        TransformCache.get(Surface, scale, rotate): return Surface
+        """
+        (scale, rotate) = self.quantize(scale, rotate)
+        bank = self._banks.get(original)
+        if bank is not None:
+            (step, frames) = bank
+            rotate = (round(rotate / step) * step) % 360
+            img = frames.get((scale, rotate))
+            if img is not None:
+                self.hits += 1
+                return img
+        if scale == 1 and rotate == 0:
+            return original
+        key = (original, scale, rotate)
+        entries = self._entries
+        img = entries.pop(key, None)
+        if img is not None:
+            self.hits += 1
+            entries[key] = img
+            return img
+
+        self.misses += 1
+        img = transform_image(original, scale, rotate)
+        size = img.get_pitch() * img.get_height()
+        if size <= self.max_bytes:
+            entries[key] = img
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                (_, old) = entries.popitem(last=False)
+                self.nbytes -= old.get_pitch() * old.get_height()
+                self.evictions += 1
+        return img
+
+    def bake(self, original, frames=36, scales=(1,), executor=None):
+        """compute the rotation frames of an image ahead of time
+
+        TransformCache.bake(Surface, frames = 36, scales = (1,),
+            executor = None): return list
+
+        Rotates the image by every multiple of 360 / frames degrees, at
+        each of the given scale ratios. The frames are computed by the
+        executor, by default a thread pool shared by the cache, so the
+        call returns right away with the list of futures; until a frame is
+        ready, it is computed on demand like any other image. Without
+        concurrent.futures the frames are computed before returning.
+
+        From now on the image's rotations are snapped to the nearest
+        frame. Baking an image again replaces its frames. The frames are
+        computed from a copy of the image, so it can be blitted while
+        they are pending.
+        """
+        step = 360.0 / frames
+        bank = {}
+        self._banks[original] = (step, bank)
+        keys = [self.quantize(scale, 0)[0] for scale in scales]
+        if executor is None:
+            if ThreadPoolExecutor is None:
+                for scale in keys:
+                    self._bake_frames(original, bank, scale, step, frames)
+                return []
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2)
+            executor = self._executor
+        source = original.copy()
+        return [executor.submit(self._bake_frames, source, bank, scale,
+                                step, frames)
+                for scale in keys]
+
+    def _bake_frames(self, original, bank, scale, step, frames):
+        for i in range(frames):
+            rotate = (i * step) % 360
+            bank[(scale, rotate)] = transform_image(original, scale, rotate)
+
+    def unbake(self, original):
+        """drop the rotation frames of an image
+
+        TransformCache.unbake(Surface): return None
+        """
+        self._banks.pop(original, None)
+
+    def stats(self):
+        """return a dict of hit/miss statistics and memory usage
+
+        'bytes' only counts the evictable images; the baked frames are
+        counted by 'frames' and 'frame_bytes'.
+        """
+        frames = [img for (step, bank) in list(self._banks.values())
+                  for img in list(bank.values())]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'frames': len(frames),
+            'frame_bytes': sum(img.get_pitch() * img.get_height()
+                               for img in frames),
+        }
+
+    def clear(self):
+        """drop every cached image and frame, keeping the statistics
+        """
+        self._entries.clear()
+        self._banks.clear()
+        self.nbytes = 0
+
+
+class TextureAtlas(object):
+    """images packed into a few shared sheets
+
+    TextureAtlas(sheet_size, padding): return TextureAtlas
+
+    Images loaded into the atlas are copied into large sheet surfaces and
+    handed out as subsurfaces of them, which can be passed to
+    Sprite.set_image like any other image:
+
+        atlas = TextureAtlas()
+        ball.set_image(atlas.load("ball.png", -1))
+
+    Loading the same file again returns the same subsurface, so any number
+    of sprites share a single copy of its pixels, as well as its
+    transformed copies in a TransformCache. Sheets are packed in shelves:
+    images are placed side by side in rows, each as high as the image
+    that opened it. An image goes on the shortest shelf it fits on, and
+    opens a new shelf when none is tall enough or has room left.
+
+    Sheets have per-pixel alpha; colorkeyed pixels become transparent.
+    The subsurfaces share their sheet's pixels, so they must not be drawn
+    on.
+    """
+
+    def __init__(self, sheet_size=(1024, 1024), padding=1):
+        self.sheet_size = sheet_size
+        self.padding = padding
+        self.sheets = []
+        self.requests = 0
+        # what the requested images would take if each was loaded by itself
+        self.unpacked_bytes = 0
+        self._images = {}   # key -> (subsurface, bytes of the source image)
+        self._shelves = []  # per sheet, [top, height, right] of its shelves
+        self._tops = []     # per sheet, the top of its next shelf
+
+    def load(self, filename, colorkey=None):
+        """load an image file into the atlas
+
+        TextureAtlas.load(filename, colorkey = None): return Surface
+
+        A colorkey of -1 takes the color of the image's topleft pixel. The
+        image is only read the first time a filename and colorkey are
+        asked for; colors given as a pygame.Color, a name or a tuple are
+        the same colorkey.
+        """
+        if colorkey is not None and not isinstance(colorkey, int):
+            colorkey = tuple(pygame.Color(colorkey))
+        key = (filename, colorkey)
+        if key not in self._images:
+            self._pack(key, pygame.image.load(filename), colorkey)
+        return self.get(key)
+
+    def add(self, name, surface, colorkey=None):
+        """copy a surface into the atlas under a name
+
+        TextureAtlas.add(name, Surface, colorkey = None): return Surface
+
+        If the name is already in the atlas, its image is returned and the
+        surface is left alone.
+        """
+        if name not in self._images:
+            self._pack(name, surface, colorkey)
+        return self.get(name)
+
+    def get(self, key):
+        """return an image already in the atlas
+
+        TextureAtlas.get(key): return Surface
+
+        The key is the name given to TextureAtlas.add, or the filename
+        and colorkey given to TextureAtlas.load, with colors as (r, g, b, a)
+        tuples.
+        """
+        (image, size) = self._images[key]
+        self.requests += 1
+        self.unpacked_bytes += size
+        return image
+
+    def _pack(self, key, surface, colorkey):
+        if colorkey is not None:
+            if colorkey == -1:
+                colorkey = surface.get_at((0, 0))
+            surface = surface.copy()
+            surface.set_colorkey(colorkey)
+        (width, height) = surface.get_size()
+        (index, pos) = self._place(width, height)
+        sheet = self.sheets[index]
+        sheet.blit(surface, pos)
+        image = sheet.subsurface(pygame.Rect(pos, (width, height)))
+        self._images[key] = (image, surface.get_pitch() * height)
+
+    def _place(self, width, height):
+        """find room for an image, returning its sheet index and position
+        """
+        pad = self.padding
+        width += pad
+        height += pad
+        best = None
+        for (index, shelves) in enumerate(self._shelves):
+            sheet_width = self.sheets[index].get_width()
+            for shelf in shelves:
+                (top, shelf_height, right) = shelf
+                if height <= shelf_height and right + width <= sheet_width \
+                        and (best is None or shelf_height < best[1][1]):
+                    best = (index, shelf)
+        if best is not None:
+            (index, shelf) = best
+            pos = (shelf[2], shelf[0])
+            shelf[2] += width
+            return (index, pos)
+
+        for (index, sheet) in enumerate(self.sheets):
+            (sheet_width, sheet_height) = sheet.get_size()
+            if self._tops[index] + height <= sheet_height and \
+                    width <= sheet_width:
+                break
+        else:
+            (sheet_width, sheet_height) = self.sheet_size
+            sheet = pygame.Surface((max(sheet_width, width),
+                                    max(sheet_height, height)),
+                                   pygame.SRCALPHA)
+            if pygame.display.get_surface() is not None:
+                sheet = sheet.convert_alpha()
+            self.sheets.append(sheet)
+            self._shelves.append([])
+            self._tops.append(0)
+            index = len(self.sheets) - 1
+        top = self._tops[index]
+        self._shelves[index].append([top, height, width])
+        self._tops[index] = top + height
+        return (index, (0, top))
+
+    def stats(self):
+        """return a dict of image counts and memory usage
+
+        'saved_bytes' is how much less memory the sheets take than the
+        requested images would if each of them was loaded separately.
+        """
+        nbytes = sum(sheet.get_pitch() * sheet.get_height()
+                     for sheet in self.sheets)
+        return {
+            'images': len(self._images),
+            'requests': self.requests,
+            'sheets': len(self.sheets),
+            'bytes': nbytes,
+            'unpacked_bytes': self.unpacked_bytes,
+            'saved_bytes': self.unpacked_bytes - nbytes,
+        }
+
+    def __contains__(self, key):
+        return key in self._images
+
+    def __len__(self):
+        return len(self._images)
+
+
+def _restore(surface, bgd, rects):
+    """draw the background over some rects of a surface
+
+    The bgd is a Surface, or a function taking the surface and a rect.
+    """
+    if callable(bgd):
+        for r in rects:
+            bgd(surface, r)
+    else:
+        surface_blit = surface.blit
+        for r in rects:
+            surface_blit(bgd, r, r)
+
+
+def _grid_cells(rect, size):
+    """return the (col, row) cells of a grid that a rect overlaps
+    """
+    return [(col, row)
+            for col in range(rect.left // size,
+                             max(rect.right - 1, rect.left) // size + 1)
+            for row in range(rect.top // size,
+                             max(rect.bottom - 1, rect.top) // size + 1)]
+
+
+def _collide_circle_rect(center, radius, rect):
+    """test if a circle and a rect intersect
+    """
+    (x, y) = center
+    dx = x - max(rect.left, min(x, rect.right))
+    dy = y - max(rect.top, min(y, rect.bottom))
+    return dx * dx + dy * dy <= radius * radius
+
+
+def _sweep_boxes(sprites):
+    """return (sprites, rects, lefts) for the sprites that can collide
+
+    The sprites must be sorted by the left edge of their rects. Sprites
+    without a rect or with an empty one are left out.
+    """
+    live = []
+    rects = []
+    lefts = []
+    for spr in sprites:
+        r = spr.rect
+        if r is not None and r.w > 0 and r.h > 0:
+            live.append(spr)
+            rects.append(r)
+            lefts.append(r.left)
+    return (live, rects, lefts)
+
+
+def _sweep_self(boxes):
+    """return the overlapping pairs among sweep boxes
+
+    Every rect is only tested against the rects that start inside its
+    horizontal extent, found by bisecting the sorted left edges.
+    """
+    (sprites, rects, lefts) = boxes
+    pairs = []
+    for i, rect in enumerate(rects):
+        start = i + 1
+        stop = bisect_left(lefts, rect.right, start)
+        if stop > start:
+            spr = sprites[i]
+            for k in rect.collidelistall(rects[start:stop]):
+                pairs.append((spr, sprites[start + k]))
+    return pairs
+
+
+def _sweep_between(boxes_a, boxes_b):
+    """return the overlapping (a, b) pairs between two sets of sweep boxes
+
+    A pair overlapping horizontally either has b starting inside a's
+    extent or a starting strictly inside b's, so each pair is found once.
+    """
+    (sprites_a, rects_a, lefts_a) = boxes_a
+    (sprites_b, rects_b, lefts_b) = boxes_b
+    pairs = []
+    for i, rect in enumerate(rects_a):
+        start = bisect_left(lefts_b, rect.left)
+        stop = bisect_left(lefts_b, rect.right, start)
+        if stop > start:
+            spr = sprites_a[i]
+            for k in rect.collidelistall(rects_b[start:stop]):
+                pairs.append((spr, sprites_b[start + k]))
+    for i, rect in enumerate(rects_b):
+        start = bisect_right(lefts_a, rect.left)
+        stop = bisect_left(lefts_a, rect.right, start)
+        if stop > start:
+            spr = sprites_b[i]
+            for k in rect.collidelistall(rects_a[start:stop]):
+                pairs.append((sprites_a[start + k], spr))
+    return pairs
+
+
+def _left_edge(sprite):
+    rect = sprite.rect
+    return rect.left if rect is not None else 0
+
+
+class DamageRegion(object):
+    """accumulator that merges damaged areas into a few rectangles
+
+    DamageRegion(max_waste, slack): return DamageRegion
+
+    Rects added to the region are merged with overlapping or nearby rects
+    (at most `slack` pixels apart) whenever their union wastes no more than
+    `max_waste` of its area on pixels outside both rects. A max_waste of 0
+    only merges rects that exactly cover their union; raising it yields
+    fewer but larger rects.
+
+    Rects are bucketed in a coarse grid, so adding a rect only looks at
+    its neighbours.
+    """
+
+    cell_size = 64
+
+    def __init__(self, max_waste=0.25, slack=0):
+        self.max_waste = max_waste
+        self.slack = slack
+        self._rects = {}  # key -> Rect
+        self._cells = {}  # (col, row) -> set of keys
+        self._next_key = 0
+
+    def _mergeable(self, rect, other):
+        union = rect.union(other)
+        overlap = rect.clip(other)
+        covered = rect.w * rect.h + other.w * other.h - overlap.w * overlap.h
+        area = union.w * union.h
+        return area - covered <= self.max_waste * area
+
+    def add(self, rect):
+        """add a damaged area to the region
+
+        DamageRegion.add(Rect): return None
+        """
+        rect = pygame.Rect(rect)
+        if rect.w <= 0 or rect.h <= 0:
+            return
+        rects = self._rects
+        cells = self._cells
+        grow = 2 * (self.slack + 1)
+        merging = True
+        while merging:
+            merging = False
+            near = rect.inflate(grow, grow)
+            candidates = set()
+            for cell in _grid_cells(near, self.cell_size):
+                candidates.update(cells.get(cell, ()))
+            for key in candidates:
+                other = rects[key]
+                if near.colliderect(other) and self._mergeable(rect, other):
+                    for cell in _grid_cells(other, self.cell_size):
+                        cells[cell].discard(key)
+                    del rects[key]
+                    rect = rect.union(other)
+                    merging = True
+                    break
+
+        key = self._next_key
+        self._next_key += 1
+        rects[key] = rect
+        for cell in _grid_cells(rect, self.cell_size):
+            cells.setdefault(cell, set()).add(key)
+
+    def extend(self, rects):
+        """add many damaged areas to the region
+        """
+        for rect in rects:
+            self.add(rect)
+
+    def rects(self):
+        """return the list of merged rects
+        """
+        return list(self._rects.values())
+
+    def clear(self):
+        self._rects.clear()
+        self._cells.clear()
+
+    def __len__(self):
+        return len(self._rects)
+
+    def __iter__(self):
+        return iter(self.rects())
+
+
+class SpatialHash(object):
+    """uniform grid index of sprites by their rects
+
+    SpatialHash(cell_size): return SpatialHash
+
+    Every sprite is stored in each grid cell its rect overlaps, so region
+    queries only look at the cells they cover and cost time proportional
+    to the number of nearby sprites rather than to the number of indexed
+    sprites. cell_size should be about the size of a typical sprite.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self._cells = {}  # (col, row) -> {sprite: None}
+        self._where = {}  # sprite -> (rect, cells)
+
+    def move(self, sprite, rect):
+        """insert a sprite or update its rect
+
+        SpatialHash.move(sprite, Rect): return None
+        """
+        rect = pygame.Rect(rect)
+        cells = _grid_cells(rect, self.cell_size)
+        entry = self._where.get(sprite)
+        if entry is not None:
+            if entry[1] == cells:
+                self._where[sprite] = (rect, cells)
+                return
+            self.remove(sprite)
+        grid = self._cells
+        for cell in cells:
+            bucket = grid.get(cell)
+            if bucket is None:
+                bucket = grid[cell] = {}
+            bucket[sprite] = None
+        self._where[sprite] = (rect, cells)
+
+    def remove(self, sprite):
+        """remove a sprite from the index, if present
+        """
+        entry = self._where.pop(sprite, None)
+        if entry is not None:
+            grid = self._cells
+            for cell in entry[1]:
+                bucket = grid[cell]
+                del bucket[sprite]
+                if not bucket:
+                    del grid[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._where.clear()
+
+    def rect_of(self, sprite):
+        """return the rect a sprite is indexed with, or None
+        """
+        entry = self._where.get(sprite)
+        return entry and entry[0]
+
+    def query_rect(self, rect):
+        """return the sprites whose rects collide with a rect
+
+        SpatialHash.query_rect(Rect): return list
+        """
+        rect = pygame.Rect(rect)
+        grid = self._cells
+        where = self._where
+        found = {}
+        for cell in _grid_cells(rect, self.cell_size):
+            bucket = grid.get(cell)
+            if bucket:
+                for sprite in bucket:
+                    if sprite not in found and \
+                            rect.colliderect(where[sprite][0]):
+                        found[sprite] = None
+        return list(found)
+
+    def query_point(self, pos):
+        """return the sprites whose rects contain a point
+
+        SpatialHash.query_point((x, y)): return list
+        """
+        (x, y) = pos
+        size = self.cell_size
+        bucket = self._cells.get((int(x // size), int(y // size)))
+        if not bucket:
+            return []
+        where = self._where
+        return [sprite for sprite in bucket
+                if where[sprite][0].collidepoint(x, y)]
+
+    def query_radius(self, center, radius):
+        """return the sprites whose rects intersect a circle
+
+        SpatialHash.query_radius((x, y), radius): return list
+        """
+        bounds = pygame.Rect(0, 0, 2 * radius + 1, 2 * radius + 1)
+        bounds.center = center
+        where = self._where
+        return [sprite for sprite in self.query_rect(bounds)
+                if _collide_circle_rect(center, radius, where[sprite][0])]
+
+    def __len__(self):
+        return len(self._where)
+
+
+class CompactSprite(object):
+    """memory-lean base class for visible game objects
+
+    pygame.sprite.CompactSprite(*groups): return CompactSprite
+
+    Implements everything Sprite does, but stores its attributes in
+    __slots__ and has no per-instance __dict__. Group membership is kept
+    inline while the sprite is in a single group and only upgraded to a
+    dict when it joins a second one. Use it for scenes with very many
+    sprites; subclasses must declare __slots__ for any attribute they add,
+    or they get a __dict__ back.
 
     """
 
+    __slots__ = ('__g', 'image', 'original', 'rect', 'dirty', 'anchor',
+                 'position', 'offset', '_layer', 'scale', 'rotate',
+                 'visible', '_batch', '_pending', '_parent', '_world',
+                 '_placed', '__weakref__')
+
+    # TransformCache shared by sprites, or None to transform on every change
+    transform_cache = None
+
+    # Lazy sprites only transform and position their image when image or
+    # rect are read, e.g. when they are drawn (see LazySprite)
+    lazy = False
+
+    # Whether the world transform is cached even without a parent; sprites
+    # with children need it, as the children compare it by identity
+    _keeps_world = False
+
+    # Group updates between two calls of update, read when joining a group
+    # (see Sprite.set_update_interval)
+    update_interval = 1
+
     def __init__(self, *groups):
         """initialize sprite instance
 
         Initializes attributes to default values, and optionally
         adds it to given groups.
         """
+        # The group the sprite is in, or a dict of groups if there are more
+        self.__g = None
+
         self.image = self.original = None
         self.rect = None
 
@@ -62,17 +782,139 @@ class Sprite(object):
         self.anchor = ANCHOR_TOPLEFT
         self.position = None
         self.offset = (0, 0)
-        self.layer = 0
+        self._layer = 0
 
         # Initialize visual attributes
         self.scale = 1
         self.rotate = 0
         self.visible = True
 
-        self.__g = {}  # The groups the sprite is in
+        # Batching depth and the updates it deferred
+        self._batch = 0
+        self._pending = 0
+
+        # The AggregatedSprite this sprite is a child of, the cached world
+        # transform (see Sprite.world_transform) and the one the image and
+        # rect were last made for
+        self._parent = None
+        self._world = None
+        self._placed = None
+
         if groups:
             self.add(*groups)
 
+    @property
+    def layer(self):
+        """the layer the sprite is drawn in
+
+        Sprites in lower layers are drawn first. Changing the layer
+        moves the sprite inside every group it belongs to.
+        """
+        return self._layer
+
+    @layer.setter
+    def layer(self, layer):
+        self._layer = layer
+        for group in self._groups():
+            group.change_layer_internal(self, layer)
+        if self._parent is not None:
+            self._parent.child_layer_changed(self, layer)
+
+    def world_transform(self):
+        """return the sprite's position, scale and rotation on screen
+
+        Sprite.world_transform(): return ((x, y), scale, rotate)
+
+        The position includes the offset. A child of an AggregatedSprite
+        is placed, scaled and rotated relative to its parent, so its
+        world transform is derived from the parent's. The result is
+        cached until the sprite or one of its ancestors changes.
+        """
+        local = (self.position, self.offset, self.scale, self.rotate)
+        parent = self._parent
+        if parent is None and not self._keeps_world:
+            (position, (off_x, off_y), scale, rotate) = local
+            if position is not None:
+                (x, y) = position
+                position = (x + off_x, y + off_y)
+            return (position, scale, rotate)
+        origin = None if parent is None else parent.world_transform()
+        cached = self._world
+        if cached is not None and cached[0] is origin and cached[1] == local:
+            return cached[2]
+        (position, (off_x, off_y), scale, rotate) = local
+        if position is not None:
+            (x, y) = position
+            position = (x + off_x, y + off_y)
+        if origin is not None:
+            (org_position, org_scale, org_rotate) = origin
+            if position is not None:
+                (x, y) = _rotate_vector(position[0] * org_scale,
+                                        position[1] * org_scale, org_rotate)
+                (org_x, org_y) = org_position or (0, 0)
+                position = (org_x + x, org_y + y)
+            scale *= org_scale
+            rotate = (rotate + org_rotate) % 360
+        world = (position, scale, rotate)
+        self._world = (origin, local, world)
+        return world
+
+    def _sync_world(self):
+        """flag the updates a change of an ancestor's transform calls for
+        """
+        placed = self._placed
+        world = self.world_transform()
+        if world is not placed:
+            if placed is None or world[1:] != placed[1:]:
+                self._pending |= _PENDING_IMAGE
+            elif world[0] != placed[0]:
+                self._pending |= _PENDING_POSITION
+            else:
+                self._placed = world
+
+    def _catch_up(self):
+        """bring the image and rect up to date with the parent's transform
+        """
+        if self._parent is not None or self._placed is not None:
+            self._sync_world()
+        if self._pending & _PENDING_SHAPE and not self._batch:
+            self.apply_pending()
+
+    def _estimated_rect(self):
+        """return a rect surely containing the rect after a pending transform
+
+        Returns None when the image is not waiting for a transformation,
+        as the rect is then known without transforming anything.
+        """
+        if not self._pending & _PENDING_IMAGE or self.original is None:
+            return None
+        (position, scale, rotate) = self.world_transform()
+        if position is None:
+            return None
+        (w, h) = self.original.get_size()
+        size = int(math.ceil(math.hypot(w, h) * scale)) + 2
+        (x, y) = position
+        if type(self.anchor) is tuple:
+            (anc_x, anc_y) = self.anchor
+            return pygame.Rect(int(x - anc_x) - 1, int(y - anc_y) - 1,
+                               size, size)
+        # the anchor lies within the image
+        return pygame.Rect(int(x) - size, int(y) - size, 2 * size, 2 * size)
+
+    def _groups(self):
+        """return an iterable over the groups the sprite is in
+        """
+        g = self.__g
+        if g is None:
+            return ()
+        elif type(g) is dict:
+            return g
+        return (g,)
+
+    def _has_group(self, group):
+        g = self.__g
+        return g is group or (type(g) is dict and group in g)
+
     def draw(self, surface):
         """draw the sprite's image on a surface
 
@@ -90,9 +932,87 @@ class Sprite(object):
     def on_visual_change(self, *args, **kwargs):
         """mark sprite as dirty on any visual change
         """
-        self.dirty = True
+        self.mark_dirty()
         return True
 
+    def mark_dirty(self):
+        """flag the sprite as changed and notify its groups
+
+        Sprite.mark_dirty(): return None
+
+        This is done automatically by the sprite's methods. Call it after
+        changing visual attributes such as image or rect directly.
+        """
+        self.dirty = True
+        if self._batch:
+            self._pending |= _PENDING_NOTIFY
+            return
+        for group in self._groups():
+            group.visual_change_internal(self)
+        if self._parent is not None:
+            self._parent.child_changed(self)
+
+    @contextmanager
+    def batch(self):
+        """defer the sprite's updates until the end of a with block
+
+        Sprite.batch(): return context manager
+
+        Inside the block, the sprite's methods only record the new
+        attributes. On exit the image is transformed once, the rect is
+        positioned once and the groups are notified once, giving the same
+        result as calling the methods one by one:
+
+            with sprite.batch():
+                sprite.scale_by(0.1)
+                sprite.rotate_by(5)
+                sprite.move_to((10, 10))
+
+        The image and rect are not up to date inside the block. Batches
+        can be nested; updates happen when the outermost one ends.
+        """
+        self.begin_batch()
+        try:
+            yield self
+        finally:
+            self.end_batch()
+
+    def begin_batch(self):
+        self._batch += 1
+
+    def end_batch(self):
+        self._batch -= 1
+        if not self._batch:
+            if not self.lazy:
+                self.apply_pending()
+            if self._pending & _PENDING_NOTIFY:
+                self._pending &= ~_PENDING_NOTIFY
+                self.mark_dirty()
+
+    def _deferring(self):
+        """tell whether image and position updates should wait
+        """
+        return self._batch or \
+            (self.lazy and not self._pending & _PENDING_APPLYING)
+
+    def apply_pending(self):
+        """run the image and position updates that were deferred
+
+        Sprite.apply_pending(): return None
+
+        Updates are deferred inside a batch or when the sprite is lazy.
+        This is called automatically when image or rect are read.
+        """
+        pending = self._pending
+        self._pending = (pending & ~_PENDING_SHAPE) | _PENDING_APPLYING
+        try:
+            if pending & _PENDING_IMAGE:
+                self.update_image()
+            elif pending & _PENDING_POSITION and self._rect is not None:
+                self.update_position()
+        finally:
+            self._pending &= ~_PENDING_APPLYING
+
     @call_hook_method('on_visual_change')
     def set_image(self, img):
         """set a new image object for the sprite
@@ -105,15 +1025,38 @@ class Sprite(object):
 
         usually useful for transformations, this method does
         not change the 'original' attribute."""
+        if self._deferring():
+            self._pending |= _PENDING_IMAGE
+            return
         img = self.original
         if img is not None:
-            if self.scale != 1:
-                img = pygame.transform.scale(img, self.scaled_size())
-            if self.rotate != 0:
-                img = pygame.transform.rotate(img, self.rotate)
-            self.image = img
-            self.rect = img.get_rect()
-            self.move_to(self.position)
+            world = self.world_transform()
+            (position, scale, rotate) = world
+            cache = self.transform_cache
+            if cache is not None:
+                img = cache.get(img, scale, rotate)
+            else:
+                img = transform_image(img, scale, rotate)
+            self._image = img
+            self._rect = img.get_rect()
+            self._placed = world if self._parent is not None else None
+        if self.position and self._rect is not None:
+            self.update_position()
+
+    def get_mask(self):
+        """return the collision mask of the sprite's current image
+
+        Sprite.get_mask(): return Mask
+
+        A mask explicitly assigned to the sprite's 'mask' attribute takes
+        precedence. Otherwise the mask is cached per image (see
+        image_mask), so rotating or scaling the sprite only builds a mask
+        for images that were not seen before.
+        """
+        mask = getattr(self, 'mask', None)
+        if mask is None:
+            mask = image_mask(self.image)
+        return mask
 
     def anchor_value(self):
         """return actual position of sprite's anchor
@@ -141,10 +1084,21 @@ class Sprite(object):
     def update_position(self):
         """ re-calculating the sprite's rect position
         """
-        (x, y) = self.position
-        (off_x, off_y) = self.offset
+        if self._deferring():
+            self._pending |= _PENDING_POSITION
+            return
+        world = self.world_transform()
+        if world[0] is None:
+            return
+        placed = self._placed
+        if placed is not None and placed[1:] != world[1:] and \
+                self.original is not None:
+            # an ancestor was scaled or rotated; update_image comes back
+            return self.update_image()
+        self._placed = world if self._parent is not None else None
+        (x, y) = world[0]
         (anc_x, anc_y) = self.anchor_value()
-        self.rect.topleft = (x + off_x - anc_x, y + off_y - anc_y)
+        self._rect.topleft = (x - anc_x, y - anc_y)
 
     @call_hook_method('on_visual_change')
     def move_to(self, pos):
@@ -203,9 +1157,10 @@ class Sprite(object):
     def scaled_size(self):
         """return the sprite's calculated size, after scaling
         """
+        scale = self.world_transform()[1]
         (width, height) = self.original.get_size()
-        width = (int)(width * self.scale)
-        height = (int)(height * self.scale)
+        width = (int)(width * scale)
+        height = (int)(height * scale)
         return (width, height)
 
     @call_hook_method('on_visual_change')
@@ -230,7 +1185,7 @@ class Sprite(object):
         Sprite will be added to the Groups it is not already a member of.
 
         """
-        has = self.__g.__contains__
+        has = self._has_group
         for group in groups:
             if hasattr(group, '_spritegroup'):
                 if not has(group):
@@ -248,7 +1203,7 @@ class Sprite(object):
         will be removed from the Groups it is currently a member of.
 
         """
-        has = self.__g.__contains__
+        has = self._has_group
         for group in groups:
             if hasattr(group, '_spritegroup'):
                 if has(group):
@@ -258,10 +1213,24 @@ class Sprite(object):
                 self.remove(*group)
 
     def add_internal(self, group):
-        self.__g[group] = 0
+        g = self.__g
+        if g is None:
+            self.__g = group
+        elif type(g) is dict:
+            g[group] = 0
+        elif g is not group:
+            self.__g = {g: 0, group: 0}
 
     def remove_internal(self, group):
-        del self.__g[group]
+        g = self.__g
+        if type(g) is dict:
+            del g[group]
+            if len(g) == 1:
+                self.__g = next(iter(g))
+        elif g is group:
+            self.__g = None
+        else:
+            raise KeyError(group)
 
     def update(self, *args):
         """method to control sprite behavior
@@ -278,6 +1247,69 @@ class Sprite(object):
         """
         pass
 
+    def update_state(self):
+        """return what a process pool needs to update the sprite
+
+        Sprite.update_state(): return object
+
+        See Group.update_parallel. The result must be picklable; the
+        default implementation returns None.
+        """
+        return None
+
+    def apply_update(self, result):
+        """apply the result of a parallel update
+
+        Sprite.apply_update(result): return None
+
+        Called by Group.update_parallel on the calling thread, in drawing
+        order, with what the sprite's update, or the function given for a
+        process pool, returned. The default implementation does nothing.
+        """
+        pass
+
+    def sleep(self, frames=None):
+        """stop receiving updates
+
+        Sprite.sleep(frames = None): return None
+
+        The groups that contain the sprite skip it in Group.update, until
+        it is woken with Sprite.wake, or after the given number of updates
+        of each group. Sleeping sprites are still drawn. Sleeping sprites
+        cost nothing per update, so idle scenery can sleep and be woken by
+        the event that concerns it.
+        """
+        for group in self._groups():
+            group.sleep_internal(self, frames)
+
+    def wake(self):
+        """resume receiving updates
+
+        Sprite.wake(): return None
+
+        Ends Sprite.sleep in every group that contains the sprite.
+        """
+        for group in self._groups():
+            group.wake_internal(self)
+
+    def set_update_interval(self, interval):
+        """update the sprite only every few group updates
+
+        Sprite.set_update_interval(interval): return None
+
+        After each update, the sprite sleeps through the next interval - 1
+        updates of its groups, e.g. far away or slow sprites can be updated
+        every 4th frame. Applies to the current groups; a Sprite also keeps
+        it as its update_interval attribute for groups it joins later,
+        while a CompactSprite takes it from its class.
+        """
+        for group in self._groups():
+            group.interval_internal(self, interval)
+        try:
+            self.update_interval = interval
+        except AttributeError:
+            pass
+
     def kill(self):
         """remove the Sprite from all Groups
 
@@ -289,9 +1321,9 @@ class Sprite(object):
         adding it to Groups.
 
         """
-        for c in self.__g:
+        for c in self._groups():
             c.remove_internal(self)
-        self.__g.clear()
+        self.__g = None
 
     def groups(self):
         """list of Groups that contain this Sprite
@@ -301,7 +1333,7 @@ class Sprite(object):
         Returns a list of all the Groups that contain this Sprite.
 
         """
-        return list(self.__g)
+        return list(self._groups())
 
     def alive(self):
         """does the sprite belong to any groups
@@ -310,21 +1342,141 @@ class Sprite(object):
 
         Returns True when the Sprite belongs to one or more Groups.
         """
-        return truth(self.__g)
+        return self.__g is not None
 
     def __repr__(self):
         return "<%s sprite(in %d groups)>" \
-            % (self.__class__.__name__, len(self.__g))
+            % (self.__class__.__name__, len(self._groups()))
+
+
+# The image and rect slots under a second name, which reads and writes them
+# without going through the properties of _Deferred subclasses
+CompactSprite._image = CompactSprite.image
+CompactSprite._rect = CompactSprite.rect
+
+
+class _Deferred(object):
+    """mixin bringing image and rect up to date whenever they are read
+
+    Used by sprites whose image and rect may wait for a pending update
+    outside of a batch: lazy sprites and aggregates.
+    """
 
+    __slots__ = ()
 
-class AggregatedSprite(Sprite):
+    @property
+    def image(self):
+        """the image drawn for the sprite
+
+        Applies any pending transformation first.
+        """
+        if self._parent is not None:
+            self._sync_world()
+        if self._pending & _PENDING_SHAPE and not self._batch:
+            self.apply_pending()
+        return self._image
+
+    @image.setter
+    def image(self, image):
+        self._image = image
+
+    @property
+    def rect(self):
+        """the rect the sprite's image is drawn at
+
+        Applies any pending transformation or positioning first.
+        """
+        if self._parent is not None:
+            self._sync_world()
+        if self._pending & _PENDING_SHAPE and not self._batch:
+            self.apply_pending()
+        return self._rect
+
+    @rect.setter
+    def rect(self, rect):
+        self._rect = rect
+
+
+class Sprite(CompactSprite):
+    """simple base class for visible game objects
+
+    pygame.sprite.Sprite(*groups): return Sprite
+
+    The base class for visible game objects. Derived classes will want to
+    override the Sprite.update() method and assign Sprite.image and Sprite.rect
+    attributes.  The initializer can accept any number of Group instances that
+    the Sprite will become a member of.
+
+    When subclassing the Sprite class, be sure to call the base initializer
+    before adding the Sprite to Groups.
+
+    """
+
+
+class LazyCompactSprite(_Deferred, CompactSprite):
+    """CompactSprite that transforms its image only when it is needed
+
+    pygame.sprite.LazyCompactSprite(*groups): return LazyCompactSprite
+
+    See LazySprite.
+    """
+
+    __slots__ = ()
+
+    lazy = True
+
+
+class LazySprite(_Deferred, Sprite):
+    """Sprite that transforms its image only when it is needed
+
+    pygame.sprite.LazySprite(*groups): return LazySprite
+
+    Scaling, rotating, moving or setting the image only records the new
+    attributes. The image is transformed and the rect positioned the first
+    time image or rect are read afterwards, e.g. when the sprite is drawn,
+    so sprites that are hidden, culled or changed several times between
+    two draws transform their image at most once, or never.
+
+    Reading image and rect is slower than for a Sprite, which is why this
+    is a separate class.
+    """
+
+    lazy = True
+
+
+class AggregatedSprite(_Deferred, Sprite):
     """aggregated sprite class collects many sprites into single entity
 
     pygame.sprite.AggregatedSprite(*groups): return AggregatedSprite
 
-    The aggregated sprite holds a list of child sprites and propagates
-    every visual change to all of the child sprites.
+    The aggregated sprite is the parent of a list of child sprites, whose
+    positions, scales and rotations are relative to it: a child at
+    (10, 0) is drawn 10 pixels away from the aggregate's position, and is
+    scaled and rotated around that position along with the aggregate.
+    Changing the aggregate does not touch its children; they work out
+    their own transform from their parent's when they are next drawn (see
+    Sprite.world_transform). A child's image and rect are therefore only
+    up to date once the aggregate was drawn, or after calling
+    AggregatedSprite.update_children; LazySprite children bring them up to
+    date whenever they are read. Aggregates can be nested.
+
+    Children are drawn in layer order, and the aggregate's rect is kept
+    as the union of the visible children's rects, so groups can cull and
+    clear it as a whole. Children are drawn through their aggregate and
+    should not be added to groups themselves.
+
+    A flattened aggregate instead renders its children once into a cached
+    composite image, and is then moved, scaled and rotated as a single
+    sprite: one blit and at most one transform per change, however many
+    children it has. The composite is rebuilt when a child changes. It
+    is rotated as one image around the aggregate's position, so it only
+    matches the children exactly for those anchored at their center;
+    other children are placed by the corner or edge of their own rotated
+    image, and may be a few pixels away from the composite.
     """
+
+    _keeps_world = True
+
     def __init__(self, *groups):
         """iniitalizes sprite
         """
@@ -336,61 +1488,563 @@ class AggregatedSprite(Sprite):
         # according to added sprite.
         self.rect = pygame.Rect(0, 0, 0, 0)
         self.position = (0, 0)
+        # flattening state, see AggregatedSprite.flatten
+        self.flattened = False
+        self._composite = None
+        # children in drawing order, the rects their union was computed
+        # from and the children that changed since
+        self._children = _LayerOrder()
+        self._child_rects = {}
+        self._stale_children = {}
+        # the union of the children's rects, and the world transform and
+        # shift it is relative to
+        self._bounds = pygame.Rect(0, 0, 0, 0)
+        self._frame = None
 
     def add_sprite(self, sprite):
         """add a sprite to the list of child sprites
+
+        The sprite's position is from now on relative to the aggregate.
         """
         self.sprites.append(sprite)
-
-    def draw(self, surface):
-        """draw child sprites in order
-
-        AggregatedSprite.draw(surface): return Rect
-
-        Returns a rectangle that is the union of all
-        child sprites' rects.
+        self._children.add(sprite, sprite.layer)
+        sprite._parent = self
+        for i in range(self._batch):
+            sprite.begin_batch()
+        self.child_changed(sprite)
+
+    def remove_sprite(self, sprite):
+        """remove a sprite from the list of child sprites
+        """
+        self.sprites.remove(sprite)
+        self._children.remove(sprite)
+        sprite._parent = None
+        sprite._sync_world()
+        for i in range(self._batch):
+            sprite.end_batch()
+        if not sprite.lazy:
+            sprite._catch_up()
+        self.child_changed(sprite)
+
+    def update_children(self):
+        """bring the images and rects of all descendants up to date
+
+        AggregatedSprite.update_children(): return None
+
+        Drawing the aggregate does this for the children it draws.
         """
-        #TODO consider sprite's layer attribute
-        ret = pygame.Rect(0, 0, 0, 0)
         for spr in self.sprites:
-            r = spr.draw(surface)
-            if r != 0:
-                ret.union_ip(r)
-        return ret
+            spr._catch_up()
+            if isinstance(spr, AggregatedSprite):
+                spr.update_children()
 
-    def on_visual_change(self, method, *args, **kwargs):
-        """propagate a visual attribute change to all child sprites
+    def child_changed(self, sprite):
+        """called when a child sprite was changed, added or removed
         """
-        super(AggregatedSprite, self).on_visual_change(method, *args, **kwargs)
-        if method.__name__ == 'move_to':
-            for spr in self.sprites:
-                spr.set_offset(args[0])
+        if self.flattened:
+            # rebuild the composite the next time it is needed
+            self._composite = None
+            self._pending |= _PENDING_IMAGE
         else:
-            for spr in self.sprites:
-                method(spr, *args, **kwargs)
-            if method.__name__ == 'move_by':
-                return False
-        return True
+            # update the bounds the next time they are needed
+            self._stale_children[sprite] = None
+            self._pending |= _PENDING_POSITION
+        self.mark_dirty()
 
+    def child_layer_changed(self, sprite, layer):
+        """called when a child sprite was moved to another layer
+        """
+        self._children.move(sprite, layer)
+        self.child_changed(sprite)
+
+    def _update_bounds(self):
+        """bring the union of the children's rects up to date
+
+        Only children that changed are looked at. The union grows in
+        place, and is only recomputed from scratch when a changed child
+        used to lie on its border, as the union might shrink then. The
+        rects are kept relative to where the aggregate was when they were
+        taken, so moving the aggregate by whole pixels only moves the
+        union; scaling or rotating it changes every child.
+        """
+        world = self.world_transform()
+        frame = self._frame
+        if frame is None or frame[0] is not world:
+            shift = None
+            if frame is not None and frame[0][1:] == world[1:]:
+                (old_x, old_y) = frame[0][0] or (0, 0)
+                (x, y) = world[0] or (0, 0)
+                (dx, dy) = (x - old_x, y - old_y)
+                if dx == int(dx) and dy == int(dy):
+                    shift = (frame[1][0] + int(dx), frame[1][1] + int(dy))
+            if shift is None:
+                shift = (0, 0)
+                self._child_rects.clear()
+                self._stale_children = dict.fromkeys(self.sprites)
+            self._frame = (world, shift)
+        self._placed = world
+        (shift_x, shift_y) = self._frame[1]
+        stale = self._stale_children
+        if stale:
+            self._stale_children = {}
+            rects = self._child_rects
+            bounds = self._bounds
+            empty = not rects
+            recompute = False
+            for spr in stale:
+                old = rects.pop(spr, None)
+                if old is not None and not (
+                        bounds.left < old.left and bounds.top < old.top and
+                        old.right < bounds.right and
+                        old.bottom < bounds.bottom):
+                    recompute = True
+                if spr._parent is self and spr.visible:
+                    spr._catch_up()
+                if spr._parent is self and spr.visible and \
+                        spr.rect is not None:
+                    new = rects[spr] = spr.rect.move(-shift_x, -shift_y)
+                    if empty:
+                        bounds = new.copy()
+                        empty = False
+                    elif not recompute:
+                        bounds.union_ip(new)
+            if recompute:
+                rest = list(rects.values())
+                if rest:
+                    bounds = rest[0].unionall(rest[1:])
+                else:
+                    bounds = pygame.Rect(0, 0, 0, 0)
+            self._bounds = bounds
+        self._rect = self._bounds.move(shift_x, shift_y)
 
-class AbstractGroup(object):
-    """base class for containers of sprites
+    def begin_batch(self):
+        super(AggregatedSprite, self).begin_batch()
+        for spr in self.sprites:
+            spr.begin_batch()
 
-    AbstractGroup does everything needed to behave as a normal group. You can
-    easily subclass a new group class from this or the other groups below if
-    you want to add more features.
+    def end_batch(self):
+        for spr in self.sprites:
+            spr.end_batch()
+        super(AggregatedSprite, self).end_batch()
 
-    Any AbstractGroup-derived sprite groups act like sequences and support
-    iteration, len, and so on.
+    def flatten(self):
+        """render the children into a single cached composite
 
-    """
+        AggregatedSprite.flatten(): return None
+
+        From now on changing the aggregate only transforms the composite,
+        so the children are neither drawn nor transformed. Rotating the
+        composite places children that are not anchored at their center
+        slightly differently than drawing them would.
+        """
+        if not self.flattened:
+            self.flattened = True
+            self._composite = None
+            self.update_image()
+            self.mark_dirty()
+
+    def unflatten(self):
+        """go back to drawing and transforming every child
+
+        AggregatedSprite.unflatten(): return None
+        """
+        if self.flattened:
+            self.flattened = False
+            self._composite = None
+            self._image = None
+            self._frame = None
+            self._pending = (self._pending & ~_PENDING_SHAPE) | \
+                _PENDING_POSITION
+            self.mark_dirty()
+
+    def _build_composite(self, world):
+        """draw the children into a new composite surface
+
+        Returns the composite, the position of its center relative to the
+        aggregate's position, and the world transform it was drawn with.
+        """
+        bounds = None
+        for spr in self.sprites:
+            if spr.visible:
+                spr._catch_up()
+            if spr.visible and spr.rect is not None:
+                if bounds is None:
+                    bounds = spr.rect.copy()
+                else:
+                    bounds.union_ip(spr.rect)
+        if bounds is None:
+            bounds = pygame.Rect(0, 0, 0, 0)
+        composite = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        offset = (-bounds.left, -bounds.top)
+        for spr in self._children.ordered():
+            _draw_moved(spr, composite, offset)
+        (x, y) = world[0] or (0, 0)
+        return (composite, (bounds.centerx - x, bounds.centery - y), world)
+
+    def update_image(self):
+        """transform the flattened composite, or update the bounds
+        """
+        if not self.flattened:
+            return self.update_position()
+        if self._deferring():
+            self._pending |= _PENDING_IMAGE
+            return
+        world = self.world_transform()
+        if self._composite is None:
+            self._composite = self._build_composite(world)
+        (composite, center, flat) = self._composite
+        scale = float(world[1]) / flat[1]
+        rotate = (world[2] - flat[2]) % 360
+        cache = self.transform_cache
+        if cache is not None:
+            img = cache.get(composite, scale, rotate)
+        else:
+            img = transform_image(composite, scale, rotate)
+        self._image = img
+        self._rect = img.get_rect()
+        self.update_position()
+
+    def update_position(self):
+        """place the flattened composite, or update the bounds
+
+        The composite is scaled and rotated around the aggregate's
+        position, like the children it shows. Each child is rotated
+        around its own anchor though, so this only matches them for
+        children anchored at their center.
+        """
+        if not self.flattened:
+            # the bounds are only worked out when the rect is read
+            if self._pending & _PENDING_APPLYING and not self._batch:
+                self._update_bounds()
+            else:
+                self._pending |= _PENDING_POSITION
+            return
+        if self._deferring() or self._composite is None:
+            self._pending |= _PENDING_POSITION
+            return
+        world = self.world_transform()
+        (position, scale, rotate) = world
+        self._placed = world
+        (composite, (center_x, center_y), flat) = self._composite
+        ratio = float(scale) / flat[1]
+        (x, y) = _rotate_vector(center_x * ratio, center_y * ratio,
+                                rotate - flat[2])
+        (pos_x, pos_y) = position or (0, 0)
+        self._rect.center = (pos_x + x, pos_y + y)
+
+    def draw(self, surface, offset=None):
+        """draw child sprites in layer order
+
+        AggregatedSprite.draw(surface, offset = None): return Rect
+
+        Returns a rectangle that is the union of all
+        child sprites' rects, or 0 if none was drawn.
+        """
+        if not self.visible:
+            return 0
+        if self.flattened:
+            if offset:
+                return _blit_moved(self, surface, offset)
+            return super(AggregatedSprite, self).draw(surface)
+        ret = None
+        for spr in self._children.ordered():
+            if spr.visible:
+                spr._catch_up()
+            if offset:
+                r = _draw_moved(spr, surface, offset)
+            else:
+                r = spr.draw(surface)
+            if r == 0:
+                continue
+            if ret is None:
+                ret = pygame.Rect(r)
+            else:
+                ret.union_ip(r)
+        if ret is None:
+            return 0
+        return ret
+
+
+def _blit_moved(spr, surface, offset):
+    """blit a sprite's image that far away from its rect
+    """
+    if not getattr(spr, 'visible', True):
+        return 0
+    return surface.blit(spr.image, spr.rect.move(offset))
+
+
+def _draw_moved(spr, surface, offset):
+    """draw a sprite that far away from its rect
+
+    Aggregates move their children. Sprites with a draw method of their
+    own have their rect moved for the call, as the method need not take
+    an offset; the others just have their image blitted.
+    """
+    if isinstance(spr, AggregatedSprite):
+        return spr.draw(surface, offset)
+    draw = getattr(type(spr), 'draw', None)
+    if draw is None or _function(draw) is _function(CompactSprite.draw):
+        return _blit_moved(spr, surface, offset)
+    rect = spr.rect
+    topleft = rect.topleft
+    rect.move_ip(offset)
+    try:
+        return spr.draw(surface)
+    finally:
+        rect.topleft = topleft
+
+
+def _function(method):
+    """return the function of a method, on Python 2 as well as 3
+    """
+    return getattr(method, '__func__', method)
+
+
+class _LayerOrder(object):
+    """sprites bucketed by layer, with a cached ordered view
+
+    Each layer keeps its sprites in insertion order. Changing a sprite's
+    layer only touches the two buckets involved; the ordered list is
+    rebuilt lazily by concatenating the buckets, so no sorting is needed.
+    """
+
+    def __init__(self):
+        self.buckets = {}   # layer -> {sprite: None}
+        self.layers = []    # sorted layers of non-empty buckets
+        self.layer_of = {}  # sprite -> layer
+        self.key_of = {}    # sprite -> (layer, sequence), see sort_key
+        self._ordered = None
+
+    def add(self, sprite, layer):
+        bucket = self.buckets.get(layer)
+        if bucket is None:
+            bucket = self.buckets[layer] = {}
+            insort(self.layers, layer)
+        bucket[sprite] = None
+        self.layer_of[sprite] = layer
+        self.key_of[sprite] = (layer, next(_sequence))
+        self._ordered = None
+
+    def remove(self, sprite):
+        del self.key_of[sprite]
+        layer = self.layer_of.pop(sprite)
+        bucket = self.buckets[layer]
+        del bucket[sprite]
+        if not bucket:
+            del self.buckets[layer]
+            del self.layers[bisect_left(self.layers, layer)]
+        self._ordered = None
+
+    def move(self, sprite, layer):
+        if self.layer_of[sprite] != layer:
+            self.remove(sprite)
+            self.add(sprite, layer)
+
+    def clear(self):
+        self.buckets.clear()
+        self.layer_of.clear()
+        self.key_of.clear()
+        del self.layers[:]
+        self._ordered = None
+
+    def ordered(self):
+        """return the cached list of sprites ordered by layer
+
+        The returned list is never modified in place, so it is safe to
+        iterate over it while sprites are added or removed.
+        """
+        if self._ordered is None:
+            ordered = []
+            buckets = self.buckets
+            for layer in self.layers:
+                ordered.extend(buckets[layer])
+            self._ordered = ordered
+        return self._ordered
+
+    def sort_key(self):
+        """return a function giving a sprite's place in the ordered list
+
+        Sorting a few sprites by it puts them in drawing order without
+        going through all of them. The keys are kept as sprites are added
+        and moved, as their layer and the order they entered it in.
+        """
+        return self.key_of.__getitem__
+
+
+class SpriteArray(object):
+    """struct-of-arrays state for many sprites
+
+    pygame.sprite.SpriteArray(sprites): return SpriteArray
+
+    Holds the position, offset, anchor, scale, rotation and visibility of
+    a fixed list of sprites in NumPy arrays, so that whole batches can be
+    moved, scaled or rotated with vectorized operations. The methods only
+    change the arrays; SpriteArray.sync then computes every rect position
+    in one pass and writes the changed ones back to the sprites, which
+    stay ordinary members of their groups and are drawn by Group.draw.
+    Positions are those of the sprites' position attributes, so children
+    of an AggregatedSprite are moved relative to their parent; their
+    rects are placed by the sprites themselves.
+
+    The arrays can also be modified directly. Anchors are stored in
+    pixels and refreshed from the sprites whenever their image changes.
+
+    Requires NumPy.
+    """
+
+    def __init__(self, sprites=()):
+        if numpy is None:
+            raise ImportError("SpriteArray requires numpy")
+        self.sprites = list(sprites)
+        count = len(self.sprites)
+        self.positions = numpy.zeros((count, 2))
+        self.offsets = numpy.zeros((count, 2))
+        self.anchors = numpy.zeros((count, 2))
+        self.scales = numpy.ones(count)
+        self.rotations = numpy.zeros(count)
+        self.visible = numpy.ones(count, dtype=bool)
+        self._transformed = numpy.zeros(count, dtype=bool)
+        self.pull()
+
+    def pull(self):
+        """read the current state of every sprite into the arrays
+
+        SpriteArray.pull(): return None
+        """
+        for (i, spr) in enumerate(self.sprites):
+            self.positions[i] = spr.position or (0, 0)
+            self.offsets[i] = spr.offset
+            if spr.rect is not None:
+                self.anchors[i] = spr.anchor_value()
+            self.scales[i] = spr.scale
+            self.rotations[i] = spr.rotate
+            self.visible[i] = spr.visible
+        self._transformed[:] = False
+        self._synced = (self.rect_positions(), self.visible.copy())
+
+    def move_to(self, positions, index=slice(None)):
+        """set the positions of the sprites selected by index
+        """
+        self.positions[index] = positions
+
+    def move_by(self, delta, index=slice(None)):
+        """move the sprites selected by index by a delta
+        """
+        self.positions[index] += delta
+
+    def set_offset(self, offsets, index=slice(None)):
+        self.offsets[index] = offsets
+
+    def scale_to(self, ratio, index=slice(None)):
+        """set the scale ratio of the sprites selected by index
+        """
+        self.scales[index] = ratio
+        self._transformed[index] = True
+
+    def rotate_to(self, degree, index=slice(None)):
+        """set the rotation of the sprites selected by index
+        """
+        self.rotations[index] = numpy.mod(degree, 360)
+        self._transformed[index] = True
+
+    def rect_positions(self):
+        """return an (N, 2) array of the sprites' rect top-left corners
+        """
+        return self.positions + self.offsets - self.anchors
+
+    def sync(self):
+        """write the arrays back to the sprites
+
+        SpriteArray.sync(): return int
+
+        Sprites whose scale or rotation changed get a new image first;
+        then rect positions are computed for all sprites at once and only
+        the sprites that actually changed are updated and marked dirty.
+        Returns the number of updated sprites.
+        """
+        sprites = self.sprites
+        transformed = numpy.flatnonzero(self._transformed)
+        for i in transformed:
+            spr = sprites[i]
+            spr.scale = float(self.scales[i])
+            spr.rotate = float(self.rotations[i])
+            spr.update_image()
+            if spr.rect is not None:
+                self.anchors[i] = spr.anchor_value()
+        self._transformed[:] = False
+
+        topleft = self.rect_positions()
+        (old_topleft, old_visible) = self._synced
+        changed = (topleft != old_topleft).any(axis=1)
+        changed |= self.visible != old_visible
+        changed[transformed] = True
+        self._synced = (topleft, self.visible.copy())
+
+        changed = numpy.flatnonzero(changed)
+        positions = self.positions[changed].tolist()
+        offsets = self.offsets[changed].tolist()
+        topleft = topleft[changed].tolist()
+        visible = self.visible[changed].tolist()
+        for (k, i) in enumerate(changed):
+            spr = sprites[i]
+            spr.position = tuple(positions[k])
+            spr.offset = tuple(offsets[k])
+            spr.visible = visible[k]
+            if spr._parent is not None or spr._keeps_world:
+                # placed relative to a parent, or around children
+                spr.update_position()
+            elif spr.rect is not None:
+                spr.rect.topleft = topleft[k]
+            spr.mark_dirty()
+        return len(changed)
+
+    def __len__(self):
+        return len(self.sprites)
+
+
+class AbstractGroup(object):
+    """base class for containers of sprites
+
+    AbstractGroup does everything needed to behave as a normal group. You can
+    easily subclass a new group class from this or the other groups below if
+    you want to add more features.
+
+    Any AbstractGroup-derived sprite groups act like sequences and support
+    iteration, len, and so on.
+
+    """
 
     # dummy val to identify sprite groups, and avoid infinite recursion
     _spritegroup = True
 
+    # wasted area accepted when merging damaged rects (see DamageRegion),
+    # or None to clear every rect separately
+    damage_waste = None
+
     def __init__(self):
         self.spritedict = {}
         self.lostsprites = []
+        self._order = _LayerOrder()
+        self.spatial_index = None
+        self._unindexed = {}
+        self._estimated = {}    # sprites indexed before their transform
+        self._sweep = []
+        self._sweep_members = None
+        # Awake sprites by layer, kept only while some sprites sleep or
+        # have an update interval, so that update skips sleepers
+        self._awake = None
+        self._sleeping = {}     # sprite -> update to wake at, or None
+        self._wakeups = []      # heap of (update, sequence, sprite)
+        self._intervals = {}    # sprite -> update interval above 1
+        self._due = {}          # awake sprites that have an interval
+        self._updates = 0
+        # Static sprites and layers are drawn into a cached background
+        self._static = {}
+        self._static_layers = {}
+        self._static_rects = {}  # static sprite -> rect it was baked at
+        self._baked = None       # (bgd, size, surface), or None if stale
+        self._dynamic = None     # (ordered, sprites that are not static)
+        self._bgd = None         # the bgd last passed to clear
 
     def sprites(self):
         """get a list of sprites in the group, ordered by layer
@@ -401,18 +2055,129 @@ class AbstractGroup(object):
         it is always a list, but this could change in a future version of
         pygame.) Alternatively, you can get the same information by iterating
         directly over the sprite group, e.g. 'for sprite in group'.
+
+        The order is cached by the group and kept up to date as sprites are
+        added, removed or change their layer, so no sorting happens here.
         """
-        return sorted(self.spritedict,
-                      key=lambda sprite: getattr(sprite, "layer", 0))
+        return list(self._order.ordered())
 
     def add_internal(self, sprite):
         self.spritedict[sprite] = 0
+        layer = getattr(sprite, "layer", 0)
+        self._order.add(sprite, layer)
+        if self.spatial_index is not None:
+            self._unindexed[sprite] = None
+        if self._awake is not None:
+            self._awake.add(sprite, layer)
+        interval = getattr(sprite, "update_interval", 1)
+        if interval != 1:
+            self.interval_internal(sprite, interval)
+        if self._baked is not None and self.is_static(sprite):
+            self._baked = None
 
     def remove_internal(self, sprite):
         r = self.spritedict[sprite]
         if r is not 0:
             self.lostsprites.append(r)
+        if self._static or self._static_layers:
+            if self.is_static(sprite):
+                self._baked = None
+            self._static.pop(sprite, None)
         del self.spritedict[sprite]
+        self._order.remove(sprite)
+        if self.spatial_index is not None:
+            self.spatial_index.remove(sprite)
+            self._unindexed.pop(sprite, None)
+            self._estimated.pop(sprite, None)
+        if self._awake is not None:
+            if sprite in self._sleeping:
+                del self._sleeping[sprite]
+            else:
+                self._awake.remove(sprite)
+            self._intervals.pop(sprite, None)
+            self._due.pop(sprite, None)
+
+    def change_layer_internal(self, sprite, layer):
+        static = self._static_layers and self.is_static(sprite)
+        self._order.move(sprite, layer)
+        if self._awake is not None and sprite not in self._sleeping:
+            self._awake.move(sprite, layer)
+        if static or (self._static_layers and self.is_static(sprite)):
+            self._static_switched([sprite])
+
+    def _awake_order(self):
+        """return the _LayerOrder of awake sprites, building it if needed
+        """
+        if self._awake is None:
+            awake = self._awake = _LayerOrder()
+            order = self._order
+            for layer in order.layers:
+                for spr in order.buckets[layer]:
+                    awake.add(spr, layer)
+        return self._awake
+
+    def sleep_internal(self, sprite, frames):
+        awake = self._awake_order()
+        if frames is None:
+            wake = None
+        else:
+            wake = self._updates + frames + 1
+            heappush(self._wakeups, (wake, next(_sequence), sprite))
+        if sprite not in self._sleeping:
+            awake.remove(sprite)
+        self._sleeping[sprite] = wake
+        self._due.pop(sprite, None)
+
+    def wake_internal(self, sprite):
+        if sprite not in self._sleeping:
+            return
+        del self._sleeping[sprite]
+        self._awake.add(sprite, self._order.layer_of[sprite])
+        if sprite in self._intervals:
+            self._due[sprite] = None
+        elif not self._sleeping and not self._intervals:
+            self._awake = None
+            del self._wakeups[:]
+
+    def interval_internal(self, sprite, interval):
+        if interval == 1:
+            self._intervals.pop(sprite, None)
+            self._due.pop(sprite, None)
+            return
+        self._awake_order()
+        self._intervals[sprite] = interval
+        if sprite not in self._sleeping:
+            self._due[sprite] = None
+
+    def _begin_update(self):
+        """count an update, wake the sprites due and return those awake
+        """
+        self._updates += 1
+        if self._awake is None:
+            return self._order.ordered()
+        wakeups = self._wakeups
+        sleeping = self._sleeping
+        while wakeups and wakeups[0][0] <= self._updates:
+            (wake, n, spr) = heappop(wakeups)
+            if sleeping.get(spr, -1) == wake:
+                self.wake_internal(spr)
+        if self._awake is None:
+            return self._order.ordered()
+        return self._awake.ordered()
+
+    def _end_update(self):
+        """put the sprites with an interval to sleep until they are due
+        """
+        if self._due:
+            intervals = self._intervals
+            for spr in list(self._due):
+                self.sleep_internal(spr, intervals[spr] - 1)
+
+    def visual_change_internal(self, sprite):
+        if self.spatial_index is not None:
+            self._unindexed[sprite] = None
+        if self._baked is not None and self.is_static(sprite):
+            self._baked = None
 
     def has_internal(self, sprite):
         return sprite in self.spritedict
@@ -429,7 +2194,7 @@ class AbstractGroup(object):
         return self.__class__(self.sprites())
 
     def __iter__(self):
-        return iter(self.sprites())
+        return iter(self._order.ordered())
 
     def __contains__(self, sprite):
         return self.has(sprite)
@@ -446,7 +2211,7 @@ class AbstractGroup(object):
             # It's possible that some sprite is also an iterator.
             # If this is the case, we should add the sprite itself,
             # and not the iterator object.
-            if isinstance(sprite, Sprite):
+            if isinstance(sprite, CompactSprite):
                 if not self.has_internal(sprite):
                     self.add_internal(sprite)
                     sprite.add_internal(self)
@@ -484,7 +2249,7 @@ class AbstractGroup(object):
         # old-style sprite group. Lastly, if that fails, it assumes that the
         # normal Sprite methods should be used.
         for sprite in sprites:
-            if isinstance(sprite, Sprite):
+            if isinstance(sprite, CompactSprite):
                 if self.has_internal(sprite):
                     self.remove_internal(sprite)
                     sprite.remove_internal(self)
@@ -501,6 +2266,56 @@ class AbstractGroup(object):
                         self.remove_internal(sprite)
                         sprite.remove_internal(self)
 
+    @contextmanager
+    def batch(self):
+        """defer the updates of every sprite until the end of a with block
+
+        Group.batch(): return context manager
+
+        Works like Sprite.batch for all the sprites currently in the group.
+        On exit the sprites are updated in drawing order.
+        """
+        sprites = self._order.ordered()
+        for spr in sprites:
+            spr.begin_batch()
+        try:
+            yield self
+        finally:
+            for spr in sprites:
+                spr.end_batch()
+
+    def add_many(self, sprites):
+        """add a flat iterable of sprites to group
+
+        Group.add_many(iterable): return None
+
+        A faster version of Group.add for bulk spawning. Every item must be
+        a Sprite instance; nested sequences and groups are not unpacked.
+
+        """
+        has = self.spritedict.__contains__
+        add_internal = self.add_internal
+        for sprite in sprites:
+            if not has(sprite):
+                add_internal(sprite)
+                sprite.add_internal(self)
+
+    def remove_many(self, sprites):
+        """remove a flat iterable of sprites from group
+
+        Group.remove_many(iterable): return None
+
+        A faster version of Group.remove for bulk despawning. Every item must
+        be a Sprite instance; nested sequences and groups are not unpacked.
+
+        """
+        has = self.spritedict.__contains__
+        remove_internal = self.remove_internal
+        for sprite in sprites:
+            if has(sprite):
+                remove_internal(sprite)
+                sprite.remove_internal(self)
+
     def has(self, *sprites):
         """ask if group has a sprite or sprites
 
@@ -514,7 +2329,7 @@ class AbstractGroup(object):
         return_value = False
 
         for sprite in sprites:
-            if isinstance(sprite, Sprite):
+            if isinstance(sprite, CompactSprite):
                 # Check for Sprite instance's membership in this group
                 if self.has_internal(sprite):
                     return_value = True
@@ -549,19 +2364,94 @@ class AbstractGroup(object):
         Calls the update method of every member sprite. All arguments that
         were passed to this method are passed to the Sprite update function.
 
+        Sprites that sleep (see Sprite.sleep) or are not due yet (see
+        Sprite.set_update_interval) are skipped, so the cost depends on
+        the number of sprites that are awake.
+
         """
-        for s in self.sprites():
+        for s in self._begin_update():
             s.update(*args)
+        self._end_update()
+
+    def sleeping(self):
+        """list the sprites that are skipped by update
+
+        Group.sleeping(): return list
+
+        Returns the sleeping sprites, including those waiting for their
+        update interval, ordered by layer.
+        """
+        if self._awake is None:
+            return []
+        sleeping = self._sleeping
+        return [spr for spr in self._order.ordered() if spr in sleeping]
+
+    def update_parallel(self, executor, *args, **kwargs):
+        """update the sprites in chunks on an executor
+
+        Group.update_parallel(executor, *args, chunk_size = 256,
+            function = None): return None
+
+        Splits the sprites, in drawing order, into chunks that run on a
+        concurrent.futures executor. The sprites are batched meanwhile
+        (see Group.batch): their image and position updates and group
+        notifications wait until every chunk has finished, and are then
+        applied on the calling thread in drawing order. Whatever a
+        sprite's update returns is passed to its apply_update method
+        first, also on the calling thread and in drawing order.
+
+        With a thread pool, every sprite's update(*args) runs in a worker
+        thread, which pays off when updates release the GIL, as NumPy
+        math does. An update may only change its own sprite, and not its
+        layer or groups.
+
+        Sprites cannot be sent to other processes. For a process pool,
+        pass a function defined at module level; the workers call
+        function(sprite.update_state(), *args) instead of sprite.update.
+
+        If updates raise, the exception of the first failing chunk in
+        drawing order is raised once every chunk has finished.
+        """
+        chunk_size = kwargs.pop('chunk_size', 256)
+        function = kwargs.pop('function', None)
+        if kwargs:
+            raise TypeError("unexpected keyword arguments %s"
+                            % ', '.join(sorted(kwargs)))
+        sprites = self._begin_update()
+        with self.batch():
+            futures = []
+            for i in range(0, len(sprites), chunk_size):
+                chunk = sprites[i:i + chunk_size]
+                if function is not None:
+                    chunk = [spr.update_state() for spr in chunk]
+                futures.append(
+                    executor.submit(_update_chunk, function, chunk, args))
+            error = None
+            for future in futures:
+                if future.exception() is not None and error is None:
+                    error = future.exception()
+            if error is not None:
+                raise error
+            i = 0
+            for future in futures:
+                for result in future.result():
+                    sprites[i].apply_update(result)
+                    i += 1
+        self._end_update()
 
     def draw(self, surface):
         """draw all sprites onto the surface
 
         Group.draw(surface): return None
 
-        Draws all of the member sprites onto the given surface.
+        Draws all of the member sprites onto the given surface, except the
+        static ones (see Group.set_static). Static sprites that changed
+        since the last clear are restored from the rebuilt background
+        first.
 
         """
-        sprites = self.sprites()
+        self._restore_static(surface)
+        sprites = self._dynamic_sprites()
         surface_blit = surface.blit
         for spr in sprites:
             if (hasattr(spr, 'draw')):
@@ -580,20 +2470,165 @@ class AbstractGroup(object):
         screen surface. The bgd could also be a function which accepts
         the given surface and the area to be cleared as arguments.
 
+        If the group's damage_waste is set, overlapping and adjacent areas
+        are merged first (see DamageRegion), so that fewer and larger
+        areas are cleared. Areas whose union would waste more than
+        damage_waste stay separate, and their overlap is cleared twice.
+
+        If the group has static sprites, they are restored along with the
+        background (see Group.background).
+
+        """
+        self._bgd = bgd
+        bgd = self.background(surface, bgd)
+        rects = [r for r in self._drawn_rects() if r != 0]
+        if self.damage_waste is not None:
+            region = DamageRegion(self.damage_waste)
+            region.extend(self.lostsprites)
+            region.extend(rects)
+            _restore(surface, bgd, region.rects())
+        else:
+            _restore(surface, bgd, self.lostsprites)
+            _restore(surface, bgd, rects)
+
+    def _drawn_rects(self):
+        """return the rects the sprites were last drawn at, or 0
+        """
+        return self.spritedict.values()
+
+    def set_static(self, sprite, static=True):
+        """draw a sprite into the background instead of every frame
+
+        Group.set_static(sprite, static = True): return None
+
+        Static sprites are drawn once into a cached copy of the background
+        (see Group.background), which clear restores from; draw skips
+        them. The cache is only rebuilt when a static sprite changes, is
+        added or is removed, so this suits scenery that rarely changes.
+        Static sprites end up beneath the other sprites of the group,
+        whatever their layer.
+        """
+        if static:
+            self._static[sprite] = None
+        else:
+            self._static.pop(sprite, None)
+        if self.has_internal(sprite):
+            self._static_switched([sprite])
+
+    def set_static_layer(self, layer, static=True):
+        """make every sprite of a layer static
+
+        Group.set_static_layer(layer, static = True): return None
+
+        See Group.set_static. Sprites that move into the layer become
+        static, and those leaving it stop being static.
+        """
+        if static:
+            self._static_layers[layer] = None
+        else:
+            self._static_layers.pop(layer, None)
+        self._static_switched(list(self._order.buckets.get(layer, ())))
+
+    def is_static(self, sprite):
+        """test if a sprite is drawn into the background
+
+        Group.is_static(sprite): return bool
+        """
+        return (sprite in self._static or
+                self._order.layer_of.get(sprite) in self._static_layers)
+
+    def _static_switched(self, sprites):
+        """rebake the background after sprites became static or not
+        """
+        self._baked = None
+        self._dynamic = None
+        spritedict = self.spritedict
+        for spr in sprites:
+            if self.is_static(spr):
+                r = spritedict[spr]
+                if r != 0:
+                    self.lostsprites.append(r)
+                    spritedict[spr] = 0
+            self.visual_change_internal(spr)
+
+    def _restore_static(self, surface):
+        """rebake the background if static sprites changed since clear
+
+        The areas the static sprites left and entered are restored from
+        the new background, before the other sprites are drawn over them.
+        """
+        if self._baked is not None or self._bgd is None:
+            return
+        if self._static or self._static_layers or self._static_rects:
+            lost = self.lostsprites
+            start = len(lost)
+            bgd = self.background(surface, self._bgd)
+            _restore(surface, bgd, lost[start:])
+
+    def _dynamic_sprites(self):
+        """return the sprites that are not static, ordered by layer
         """
+        ordered = self._order.ordered()
+        if not self._static and not self._static_layers:
+            return ordered
+        dynamic = self._dynamic
+        if dynamic is None or dynamic[0] is not ordered:
+            is_static = self.is_static
+            dynamic = self._dynamic = (
+                ordered, [spr for spr in ordered if not is_static(spr)])
+        return dynamic[1]
+
+    def background(self, surface, bgd):
+        """get the background with the static sprites drawn into it
+
+        Group.background(surface, bgd): return Surface
+
+        Returns a cached copy of bgd, which may be a Surface or a function
+        as in Group.clear, with the static sprites drawn onto it (see
+        Group.set_static). Blit it onto the surface for a full redraw.
+        Without static sprites, bgd is returned as it is.
+
+        When the cache is rebuilt, the areas where static sprites appeared
+        or disappeared are added to the areas the next clear restores.
+        """
+        lost = self.lostsprites
+        if not self._static and not self._static_layers:
+            if self._static_rects:
+                lost.extend(self._static_rects.values())
+                self._static_rects = {}
+                self._baked = None
+            return bgd
+        size = surface.get_size()
+        baked = self._baked
+        if baked is not None and baked[0] is bgd and baked[1] == size:
+            return baked[2]
         if callable(bgd):
-            for r in self.lostsprites:
-                bgd(surface, r)
-            for r in self.spritedict.values():
-                if r is not 0:
-                    bgd(surface, r)
+            image = pygame.Surface(size, 0, surface)
+            bgd(image, image.get_rect())
         else:
-            surface_blit = surface.blit
-            for r in self.lostsprites:
-                surface_blit(bgd, r, r)
-            for r in self.spritedict.values():
-                if r is not 0:
-                    surface_blit(bgd, r, r)
+            image = bgd.copy()
+        rects = {}
+        is_static = self.is_static
+        for spr in self._order.ordered():
+            if not is_static(spr):
+                continue
+            if hasattr(spr, 'draw'):
+                r = spr.draw(image)
+            else:
+                r = image.blit(spr.image, spr.rect)
+            if r != 0:
+                rects[spr] = r
+        old = self._static_rects
+        for (spr, r) in rects.items():
+            o = old.pop(spr, 0)
+            if o != r:
+                if o != 0:
+                    lost.append(o)
+                lost.append(r)
+        lost.extend(old.values())
+        self._static_rects = rects
+        self._baked = (bgd, size, image)
+        return image
 
     def empty(self):
         """remove all sprites
@@ -603,12 +2638,208 @@ class AbstractGroup(object):
         Removes all the sprites from the group.
 
         """
-        for s in self.sprites():
-            self.remove_internal(s)
+        lostsprites = self.lostsprites
+        for s, r in self.spritedict.items():
             s.remove_internal(self)
+            if r != 0:
+                lostsprites.append(r)
+        self.empty_internal()
+
+    def empty_internal(self):
+        self.spritedict.clear()
+        self._order.clear()
+        self.lostsprites.extend(self._static_rects.values())
+        self._static_rects = {}
+        self._static.clear()
+        self._baked = None
+        self._dynamic = None
+        self._awake = None
+        self._sleeping.clear()
+        del self._wakeups[:]
+        self._intervals.clear()
+        self._due.clear()
+        if self.spatial_index is not None:
+            self.spatial_index.clear()
+            self._unindexed.clear()
+            self._estimated.clear()
+
+    def enable_spatial_index(self, cell_size=64):
+        """index the group's sprites by position
+
+        Group.enable_spatial_index(cell_size): return SpatialHash
+
+        Makes the group maintain a SpatialHash of its sprites' rects. The
+        index is updated incrementally: sprites that changed since the
+        last query (see Sprite.mark_dirty) are re-indexed lazily when the
+        next query runs.
+
+        Sprites whose image has a pending transformation, such as lazy
+        sprites, are indexed with a rect estimated from their original
+        image, so indexing does not transform them; only the ones a query
+        finds near the estimate are transformed, to check their real rect.
+        """
+        self.spatial_index = SpatialHash(cell_size)
+        self._unindexed = dict.fromkeys(self.spritedict)
+        self._estimated = {}
+        return self.spatial_index
+
+    def disable_spatial_index(self):
+        self.spatial_index = None
+        self._unindexed = {}
+        self._estimated = {}
+
+    def update_spatial_index(self):
+        """re-index the sprites that changed since the last query
+
+        Group.update_spatial_index(): return SpatialHash
+        """
+        index = self.spatial_index
+        unindexed = self._unindexed
+        if unindexed:
+            self._unindexed = {}
+            estimated = self._estimated
+            for sprite in unindexed:
+                estimate = getattr(sprite, '_estimated_rect', None)
+                rect = estimate and estimate()
+                if rect is not None:
+                    estimated[sprite] = None
+                else:
+                    estimated.pop(sprite, None)
+                    rect = sprite.rect
+                if rect is None:
+                    index.remove(sprite)
+                else:
+                    index.move(sprite, rect)
+        return index
+
+    def _confirm(self, found, test):
+        """drop the sprites found by their estimated rect that miss
+        """
+        estimated = self._estimated
+        if not estimated:
+            return found
+        return [spr for spr in found if spr not in estimated or
+                (spr.rect is not None and test(spr.rect))]
+
+    def sprites_in_rect(self, rect):
+        """get the sprites whose rects collide with a rect
+
+        Group.sprites_in_rect(Rect): return list
+
+        Uses the spatial index when enabled; otherwise every sprite is
+        checked. The sprites are returned in no particular order.
+        """
+        if self.spatial_index is not None:
+            rect = pygame.Rect(rect)
+            return self._confirm(self.update_spatial_index().query_rect(rect),
+                                 rect.colliderect)
+        rect = pygame.Rect(rect)
+        return [spr for spr in self.spritedict
+                if spr.rect is not None and rect.colliderect(spr.rect)]
+
+    def sprites_at(self, pos):
+        """get the sprites whose rects contain a point
+
+        Group.sprites_at((x, y)): return list
+        """
+        if self.spatial_index is not None:
+            return self._confirm(self.update_spatial_index().query_point(pos),
+                                 lambda rect: rect.collidepoint(pos))
+        return [spr for spr in self.spritedict
+                if spr.rect is not None and spr.rect.collidepoint(pos)]
+
+    def sprites_in_radius(self, center, radius):
+        """get the sprites whose rects intersect a circle
+
+        Group.sprites_in_radius((x, y), radius): return list
+        """
+        if self.spatial_index is not None:
+            return self._confirm(
+                self.update_spatial_index().query_radius(center, radius),
+                lambda rect: _collide_circle_rect(center, radius, rect))
+        return [spr for spr in self.spritedict if spr.rect is not None
+                and _collide_circle_rect(center, radius, spr.rect)]
+
+    def sweep_order(self):
+        """get the group's sprites sorted by the left edge of their rects
+
+        Group.sweep_order(): return list
+
+        The order is kept between calls and only re-sorted, which is close
+        to linear time when sprites moved little since the previous call.
+        This is the broad phase used by the collide methods.
+        """
+        members = self._order.ordered()
+        sweep = self._sweep
+        if self._sweep_members is not members:
+            self._sweep_members = members
+            spritedict = self.spritedict
+            sweep = [spr for spr in sweep if spr in spritedict]
+            if len(sweep) != len(members):
+                known = set(sweep)
+                sweep.extend(spr for spr in members if spr not in known)
+            self._sweep = sweep
+        sweep.sort(key=_left_edge)
+        return list(sweep)
+
+    def collide(self, sprite, collided=None):
+        """get the sprites in the group that collide with a sprite
+
+        Group.collide(sprite, collided = None): return Sprite_list
+
+        Rects are tested first, using the spatial index when enabled. The
+        optional collided callback, such as collide_mask, is then called
+        with (sprite, member) for every candidate and must return True for
+        a collision. The sprite itself is never reported.
+        """
+        rect = sprite.rect
+        if rect is None:
+            return []
+        found = [spr for spr in self.sprites_in_rect(rect)
+                 if spr is not sprite]
+        if collided is not None:
+            found = [spr for spr in found if collided(sprite, spr)]
+        return found
+
+    def collide_group(self, group, collided=None):
+        """find collisions between the sprites of two groups
+
+        Group.collide_group(group, collided = None): return Sprite_dict
+
+        Returns a dictionary mapping every sprite of this group that
+        collides with something to the list of sprites of the other group
+        it collides with. Candidates are found by sweeping both groups
+        along the x axis, which needs no more than sorting when the
+        sprites are already nearly in order; the optional collided
+        callback is then called with (sprite, other) for every candidate
+        pair.
+        """
+        pairs = _sweep_between(_sweep_boxes(self.sweep_order()),
+                               _sweep_boxes(group.sweep_order()))
+        crashed = {}
+        for (spr, other) in pairs:
+            if collided is None or collided(spr, other):
+                crashed.setdefault(spr, []).append(other)
+        return crashed
+
+    def collide_pairs(self, collided=None):
+        """find the pairs of colliding sprites inside the group
+
+        Group.collide_pairs(collided = None): return list
+
+        Returns a list of (sprite, sprite) tuples, each colliding pair
+        reported once. Candidates come from the same sweep as
+        collide_group and are filtered with the optional collided callback.
+        """
+        pairs = _sweep_self(_sweep_boxes(self.sweep_order()))
+        if collided is not None:
+            pairs = [(a, b) for (a, b) in pairs if collided(a, b)]
+        return pairs
 
     def __nonzero__(self):
-        return truth(self.sprites())
+        return truth(self.spritedict)
+
+    __bool__ = __nonzero__
 
     def __len__(self):
         """return number of sprites in group
@@ -618,12 +2849,20 @@ class AbstractGroup(object):
         Returns the number of sprites contained in the group.
 
         """
-        return len(self.sprites())
+        return len(self.spritedict)
 
     def __repr__(self):
         return "<%s(%d sprites)>" % (self.__class__.__name__, len(self))
 
 
+def _update_chunk(function, items, args):
+    """update a chunk of sprites on an executor, returning the results
+    """
+    if function is None:
+        return [spr.update(*args) for spr in items]
+    return [function(item, *args) for item in items]
+
+
 class Group(AbstractGroup):
     """container class for many Sprites
 
@@ -647,5 +2886,875 @@ class Group(AbstractGroup):
         AbstractGroup.__init__(self)
         self.add(*sprites)
 
+
+class DirtyGroup(Group):
+    """group that only redraws what changed
+
+    pygame.sprite.DirtyGroup(*sprites): return DirtyGroup
+
+    Keeps track of the sprites that were changed (see Sprite.mark_dirty),
+    added or removed since the last draw. DirtyGroup.draw repaints only the
+    damaged areas of the screen: the background is restored there and
+    every sprite overlapping them is redrawn, clipped to the damage. The
+    returned rects can be passed to pygame.display.update. When nothing
+    changed, drawing costs next to nothing.
+
+    Since unchanged parts of the screen are left alone, the whole
+    background should only be blitted once, or after calling repaint().
+    """
+
+    damage_waste = 0.25
+
+    def __init__(self, *sprites):
+        self._changed = {}
+        self._repaint = False
+        Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite):
+        Group.add_internal(self, sprite)
+        self._changed[sprite] = None
+
+    def remove_internal(self, sprite):
+        Group.remove_internal(self, sprite)
+        self._changed.pop(sprite, None)
+
+    def empty_internal(self):
+        Group.empty_internal(self)
+        self._changed.clear()
+
+    def change_layer_internal(self, sprite, layer):
+        Group.change_layer_internal(self, sprite, layer)
+        self._changed[sprite] = None
+
+    def visual_change_internal(self, sprite):
+        Group.visual_change_internal(self, sprite)
+        self._changed[sprite] = None
+
+    def clear(self, surface, bgd):
+        """set the background used to repaint damaged areas
+
+        DirtyGroup.clear(surface, bgd): return None
+
+        Nothing is erased right away; the next draw restores bgd under the
+        damaged areas. The bgd can be a Surface or a function, as in
+        Group.clear.
+        """
+        self._bgd = bgd
+
+    def repaint(self):
+        """redraw the whole surface on the next draw
+
+        DirtyGroup.repaint(): return None
+        """
+        self._repaint = True
+
+    def draw(self, surface):
+        """redraw the damaged areas of the surface
+
+        DirtyGroup.draw(surface): return Rect_list
+
+        Returns the list of rects that were repainted, suitable for
+        pygame.display.update. Dirty flags of the redrawn sprites are
+        cleared.
+        """
+        spritedict = self.spritedict
+        bgd = self._bgd
+        if bgd is not None:
+            bgd = self.background(surface, bgd)
+        damage = self.lostsprites
+        self.lostsprites = []
+        changed = self._changed
+        self._changed = {}
+        if self._repaint:
+            self._repaint = False
+            damage = [surface.get_rect()]
+        static = self._static or self._static_layers
+        for spr in changed:
+            if static and self.is_static(spr):
+                continue
+            r = spritedict[spr]
+            if r != 0:
+                damage.append(r)
+            if getattr(spr, 'visible', True) and spr.rect is not None:
+                r = spr.rect.copy()
+                damage.append(r)
+                spritedict[spr] = r
+            else:
+                spritedict[spr] = 0
+            spr.dirty = False
+        if not damage:
+            return damage
+        if self.damage_waste is not None:
+            region = DamageRegion(self.damage_waste)
+            region.extend(damage)
+            damage = region.rects()
+
+        if bgd is not None:
+            _restore(surface, bgd, damage)
+
+        clip = surface.get_clip()
+        for spr in self._dynamic_sprites():
+            if not getattr(spr, 'visible', True):
+                continue
+            rect = spr.rect
+            if rect is None:
+                continue
+            for i in rect.collidelistall(damage):
+                surface.set_clip(damage[i].clip(clip))
+                spr.draw(surface)
+        surface.set_clip(clip)
+        return damage
+
+
+class CameraGroup(Group):
+    """group that shows part of a larger world through a viewport
+
+    pygame.sprite.CameraGroup(viewport, *sprites): return CameraGroup
+
+    Sprites keep their positions in world coordinates. The camera draws
+    the part of the world starting at its scroll position into the
+    viewport, a Rect of the target surface; scrolling the camera moves
+    what is shown without touching the sprites. Sprites are looked up
+    with a spatial index (see Group.enable_spatial_index), so drawing and
+    clearing cost time proportional to the number of visible sprites,
+    however large the world is.
+    """
+
+    def __init__(self, viewport, *sprites, **kwargs):
+        self.viewport = pygame.Rect(viewport)
+        self.scroll = (0, 0)
+        self._drawn = {}
+        Group.__init__(self, *sprites)
+        self.enable_spatial_index(kwargs.get('cell_size', 64))
+
+    def copy(self):
+        """copy a camera with the same viewport, scroll and sprites
+
+        CameraGroup.copy(): return CameraGroup
+        """
+        camera = self.__class__(self.viewport, self.sprites(),
+                                cell_size=self.spatial_index.cell_size)
+        camera.scroll = self.scroll
+        return camera
+
+    def remove_internal(self, sprite):
+        Group.remove_internal(self, sprite)
+        self._drawn.pop(sprite, None)
+
+    def set_static(self, sprite, static=True):
+        raise TypeError("a scrolling camera cannot keep sprites "
+                        "in its background")
+
+    def set_static_layer(self, layer, static=True):
+        raise TypeError("a scrolling camera cannot keep sprites "
+                        "in its background")
+
+    def empty_internal(self):
+        Group.empty_internal(self)
+        self._drawn.clear()
+
+    def scroll_to(self, pos):
+        """show the world starting at a position
+
+        CameraGroup.scroll_to((x, y)): return None
+        """
+        self.scroll = tuple(pos)
+
+    def scroll_by(self, delta):
+        """move the camera by a certain delta
+
+        CameraGroup.scroll_by((dx, dy)): return None
+        """
+        (x, y) = self.scroll
+        (delta_x, delta_y) = delta
+        self.scroll = (x + delta_x, y + delta_y)
+
+    def center_on(self, pos):
+        """scroll so that a world position is in the middle of the viewport
+
+        CameraGroup.center_on((x, y)): return None
+        """
+        (x, y) = pos
+        self.scroll = (x - self.viewport.width // 2,
+                       y - self.viewport.height // 2)
+
+    def view_rect(self):
+        """return the part of the world the camera shows
+
+        CameraGroup.view_rect(): return Rect
+        """
+        return pygame.Rect(self.scroll, self.viewport.size)
+
+    def offset(self):
+        """return what to add to world positions to get surface positions
+
+        CameraGroup.offset(): return (x, y)
+        """
+        (x, y) = self.scroll
+        return (self.viewport.left - x, self.viewport.top - y)
+
+    def to_world(self, pos):
+        """convert a position on the surface, such as the mouse's
+
+        CameraGroup.to_world((x, y)): return (x, y)
+        """
+        (x, y) = pos
+        (off_x, off_y) = self.offset()
+        return (x - off_x, y - off_y)
+
+    def visible_sprites(self):
+        """get the sprites the camera shows, in drawing order
+
+        CameraGroup.visible_sprites(): return list
+        """
+        view = self.view_rect()
+        found = self.update_spatial_index().query_rect(view)
+        found = [spr for spr in found if getattr(spr, 'visible', True)]
+        visible = self._confirm(found, view.colliderect)
+        visible.sort(key=self._order.sort_key())
+        return visible
+
+    def draw(self, surface):
+        """draw the visible sprites into the viewport
+
+        CameraGroup.draw(surface): return None
+
+        Sprites outside the view are skipped, and drawing is clipped to
+        the viewport. The camera blits the sprites' images itself, moved
+        to the viewport. Sprites overriding draw have it called instead,
+        with their rect moved to the viewport for the duration of the
+        call; aggregates move their children themselves.
+        """
+        offset = self.offset()
+        spritedict = self.spritedict
+        for spr in self._drawn:
+            spritedict[spr] = 0
+        drawn = {}
+        clip = surface.get_clip()
+        surface.set_clip(self.viewport.clip(clip))
+        for spr in self.visible_sprites():
+            spritedict[spr] = drawn[spr] = _draw_moved(spr, surface, offset)
+        surface.set_clip(clip)
+        self._drawn = drawn
+        self.lostsprites = []
+
+    def _drawn_rects(self):
+        return self._drawn.values()
+
+
+class _CachedLayer(object):
+    """offscreen surface holding the sprites of one layer
+
+    Remembers the rect every sprite was drawn at and the sprites changed
+    since, so that only the areas they left and entered are redrawn.
+    """
+
+    def __init__(self, size):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA, 32)
+        self.drawn = {}     # sprite -> Rect it was drawn at
+        self.changed = {}   # sprites to redraw
+        self.bounds = None  # union of the drawn rects
+
+    def render(self, sprites, skip, max_waste):
+        """redraw the changed areas, given the layer's sprites in order
+        """
+        drawn = self.drawn
+        damage = []
+        for spr in self.changed:
+            r = drawn.pop(spr, None)
+            if r is not None:
+                damage.append(r)
+            if (spr in sprites and not skip(spr) and
+                    getattr(spr, 'visible', True) and spr.rect is not None):
+                r = drawn[spr] = spr.rect.copy()
+                damage.append(r)
+        self.changed = {}
+        if not damage:
+            return
+        if max_waste is not None:
+            region = DamageRegion(max_waste)
+            region.extend(damage)
+            damage = region.rects()
+        surface = self.surface
+        clip = surface.get_clip()
+        transparent = (0, 0, 0, 0)
+        for rect in damage:
+            surface.fill(transparent, rect)
+        for spr in sprites:
+            rect = drawn.get(spr)
+            if rect is None:
+                continue
+            for i in rect.collidelistall(damage):
+                surface.set_clip(damage[i].clip(clip))
+                spr.draw(surface)
+        surface.set_clip(clip)
+        if drawn:
+            rects = list(drawn.values())
+            self.bounds = rects[0].unionall(rects[1:])
+        else:
+            self.bounds = None
+
+
+class LayerCacheGroup(Group):
+    """group that keeps every layer in its own offscreen surface
+
+    pygame.sprite.LayerCacheGroup(*sprites): return LayerCacheGroup
+
+    Every layer is drawn into a transparent surface as large as the target
+    surface, and draw composites the frame from these surfaces in layer
+    order. When a sprite changes, is added or removed, only the areas it
+    left and entered are redrawn, and only in its own layer; the other
+    layers are blitted as they are. A busy foreground over a detailed but
+    rarely changing midground then no longer redraws the midground's
+    sprites.
+
+    Each cached layer costs a surface of the target's size, and layers
+    that change completely every frame gain nothing from the cache; they
+    can be drawn directly instead (see LayerCacheGroup.set_cached).
+
+    Cached layers look the same as a Group's drawing as long as the
+    translucent pixels of a layer's sprites do not overlap each other.
+    Where they do, they are blended together on the transparent layer
+    before being blended onto the frame, which gives other colors.
+    Opaque and colorkeyed sprites, and translucent ones in different
+    layers, always match; a layer of overlapping translucent sprites,
+    such as particles, should not be cached.
+    """
+
+    damage_waste = 0.25
+
+    def __init__(self, *sprites):
+        self._layers = {}     # layer -> _CachedLayer
+        self._uncached = {}
+        self._size = None
+        self._composited = []
+        Group.__init__(self, *sprites)
+
+    def _changed_in(self, layer, sprite):
+        cache = self._layers.get(layer)
+        if cache is not None:
+            cache.changed[sprite] = None
+
+    def add_internal(self, sprite):
+        Group.add_internal(self, sprite)
+        self._changed_in(self._order.layer_of[sprite], sprite)
+
+    def remove_internal(self, sprite):
+        layer = self._order.layer_of[sprite]
+        Group.remove_internal(self, sprite)
+        self._changed_in(layer, sprite)
+
+    def change_layer_internal(self, sprite, layer):
+        old = self._order.layer_of[sprite]
+        Group.change_layer_internal(self, sprite, layer)
+        self._changed_in(old, sprite)
+        self._changed_in(layer, sprite)
+
+    def visual_change_internal(self, sprite):
+        Group.visual_change_internal(self, sprite)
+        self._changed_in(self._order.layer_of[sprite], sprite)
+
+    def empty_internal(self):
+        Group.empty_internal(self)
+        self._layers.clear()
+
+    def set_cached(self, layer, cached=True):
+        """choose whether a layer is drawn through its offscreen surface
+
+        LayerCacheGroup.set_cached(layer, cached = True): return None
+
+        Layers are cached by default. The sprites of uncached layers are
+        drawn onto the target surface on every draw, between the layers
+        below and above them.
+        """
+        if cached:
+            self._uncached.pop(layer, None)
+        else:
+            self._uncached[layer] = None
+            self._layers.pop(layer, None)
+
+    def draw(self, surface):
+        """composite the layers onto the surface
+
+        LayerCacheGroup.draw(surface): return None
+
+        Redraws the changed areas of the cached layers, then blits the
+        part of every layer that holds sprites onto the surface. The
+        drawn areas are what the next clear restores. Static sprites are
+        handled as in Group.draw.
+        """
+        self._restore_static(surface)
+        size = surface.get_size()
+        if size != self._size:
+            self._size = size
+            self._layers.clear()
+        order = self._order
+        caches = self._layers
+        uncached = self._uncached
+        spritedict = self.spritedict
+        if self._static or self._static_layers:
+            skip = self.is_static
+        else:
+            skip = lambda spr: False
+        composited = []
+        for layer in order.layers:
+            sprites = order.buckets[layer]
+            if layer in uncached:
+                for spr in sprites:
+                    if not skip(spr):
+                        r = spritedict[spr] = spr.draw(surface)
+                        if r != 0:
+                            composited.append(r)
+                continue
+            cache = caches.get(layer)
+            if cache is None:
+                cache = caches[layer] = _CachedLayer(size)
+                cache.changed = dict.fromkeys(sprites)
+            cache.render(sprites, skip, self.damage_waste)
+            if cache.bounds is not None:
+                composited.append(surface.blit(cache.surface, cache.bounds,
+                                               cache.bounds))
+        for layer in list(caches):
+            if layer not in order.buckets:
+                del caches[layer]
+        self._composited = composited
+        self.lostsprites = []
+
+    def _drawn_rects(self):
+        return self._composited
+
+
 RenderPlain = Group
 RenderClear = Group
+
+
+def spritecollide(sprite, group, dokill, collided=None):
+    """find sprites in a group that intersect another sprite
+
+    pygame.sprite.spritecollide(sprite, group, dokill, collided = None):
+        return Sprite_list
+
+    Works like Group.collide. If dokill is True, the colliding sprites are
+    removed from all groups.
+    """
+    crashed = group.collide(sprite, collided)
+    if dokill:
+        for spr in crashed:
+            spr.kill()
+    return crashed
+
+
+def groupcollide(groupa, groupb, dokilla, dokillb, collided=None):
+    """find all sprites that collide between two groups
+
+    pygame.sprite.groupcollide(groupa, groupb, dokilla, dokillb,
+        collided = None): return dict
+
+    Works like Group.collide_group. The dokill arguments remove the
+    colliding sprites of either group from all their groups.
+    """
+    crashed = groupa.collide_group(groupb, collided)
+    if dokilla:
+        for spr in crashed:
+            spr.kill()
+    if dokillb:
+        for others in crashed.values():
+            for spr in others:
+                spr.kill()
+    return crashed
+
+
+def collide_mask(left, right):
+    """collision detection between two sprites, using masks
+
+    pygame.sprite.collide_mask(SpriteLeft, SpriteRight): return point
+
+    Tests for collision between two sprites by testing if their bitmasks
+    overlap, using Sprite.get_mask. Returns the first point of overlap, or
+    None. Pass it as the collided argument of the group collide methods
+    so it only runs on pairs whose rects collide.
+    """
+    offset = (right.rect.left - left.rect.left,
+              right.rect.top - left.rect.top)
+    return left.get_mask().overlap(right.get_mask(), offset)
+
+
+class FrameStats(object):
+    """counters and timings of the sprite module, per frame and per group
+
+    FrameStats(): return FrameStats
+
+    Collected while enabled with enable_stats. The counters of the frame
+    in progress are in the 'counters' dict, and the ones of each group
+    whose update, draw or clear ran in 'groups', a dict of dicts keyed by
+    group. Calling FrameStats.end_frame once per frame moves them to
+    'last_frame', where a debug overlay can read a whole frame:
+
+        stats = enable_stats()
+        ...
+        frame = stats.end_frame()
+        text = "%(blits)d blits" % frame['counters']
+
+    Counters are only present once they were counted:
+
+        update_image      sprite images updated
+        transform_scale   images scaled
+        transform_rotate  images rotated
+        blits             sprites drawn, and pixels_drawn their area
+        clears            background rects restored, and pixels_cleared
+        sorts             sprite lists sorted: a CameraGroup's visible
+                          sprites, and the collide methods' sweep order
+        order_rebuilds    drawing orders rebuilt, by joining the layers
+        hooks             hooked method calls dispatched
+        update, draw, clear
+                          group method calls, and update_time, draw_time
+                          and clear_time the seconds spent in them
+
+    Sprite counters of a frame also go to the group that was updating,
+    drawing or clearing at the time.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.groups = {}
+        self.totals = {}
+        self.frames = 0
+        self.last_frame = {'counters': {}, 'groups': {}}
+        self.group = None
+
+    def count(self, name, amount=1):
+        """add to a counter of the frame, and of the current group
+        """
+        counters = self.counters
+        counters[name] = counters.get(name, 0) + amount
+        if self.group is not None:
+            counters = self.groups.setdefault(self.group, {})
+            counters[name] = counters.get(name, 0) + amount
+
+    def end_frame(self):
+        """finish the frame, returning its counters
+
+        FrameStats.end_frame(): return dict
+
+        The returned dict has the frame's 'counters' and 'groups'. The
+        counters are added to 'totals', and the next frame starts empty.
+        """
+        totals = self.totals
+        for (name, amount) in self.counters.items():
+            totals[name] = totals.get(name, 0) + amount
+        self.last_frame = {'counters': self.counters, 'groups': self.groups}
+        self.counters = {}
+        self.groups = {}
+        self.frames += 1
+        return self.last_frame
+
+
+# the FrameStats collecting
+_stats = None
+
+# the wrappers each instrument (statistics, tracing) installs, as lists of
+# (owner, name, wrap), and the true originals of the attributes replaced
+_instruments = {}
+_originals = {}
+
+
+def _instrument(kind, wrappers):
+    """install, or with None remove, the wrappers of an instrument
+
+    Every replaced attribute is rebuilt from its true original, wrapped by
+    all the instruments still enabled, so they can be enabled and
+    disabled in any order.
+    """
+    if wrappers is None:
+        _instruments.pop(kind, None)
+    else:
+        _instruments[kind] = wrappers
+    wanted = {}
+    for enabled in sorted(_instruments):
+        for (owner, name, wrap) in _instruments[enabled]:
+            wanted.setdefault((owner, name), []).append(wrap)
+    for key in list(_originals):
+        if key not in wanted:
+            (owner, name) = key
+            setattr(owner, name, _originals.pop(key))
+    for (key, wrappers) in wanted.items():
+        (owner, name) = key
+        if key not in _originals:
+            _originals[key] = owner.__dict__[name]
+        original = attr = _originals[key]
+        for wrap in wrappers:
+            attr = wraps(original)(wrap(attr))
+        setattr(owner, name, attr)
+
+
+# the group methods timed by statistics and traced
+_GROUP_PHASES = [(AbstractGroup, ('update', 'draw', 'clear')),
+                 (DirtyGroup, ('draw', 'clear')),
+                 (CameraGroup, ('draw',)),
+                 (LayerCacheGroup, ('draw',))]
+
+
+def _count_calls(stats, counter):
+    def wrap(method):
+        def counted(*args, **kwargs):
+            stats.count(counter)
+            return method(*args, **kwargs)
+        return counted
+    return wrap
+
+
+def _time_group_calls(stats, phase):
+    def wrap(method):
+        def timed(group, *args, **kwargs):
+            outer = stats.group
+            if outer is group:
+                # an override calling its base class
+                return method(group, *args, **kwargs)
+            stats.group = group
+            start = default_timer()
+            try:
+                return method(group, *args, **kwargs)
+            finally:
+                stats.count(phase + '_time', default_timer() - start)
+                stats.count(phase)
+                stats.group = outer
+        return timed
+    return wrap
+
+
+def _count_blits(stats):
+    def wrap(method):
+        def counted(self, *args, **kwargs):
+            r = method(self, *args, **kwargs)
+            if r != 0:
+                stats.count('blits')
+                stats.count('pixels_drawn', r.width * r.height)
+            return r
+        return counted
+    return wrap
+
+
+def _count_clears(stats):
+    def wrap(function):
+        def counted(surface, bgd, rects):
+            rects = list(rects)
+            stats.count('clears', len(rects))
+            stats.count('pixels_cleared',
+                        sum(r.width * r.height for r in rects))
+            return function(surface, bgd, rects)
+        return counted
+    return wrap
+
+
+def _count_transforms(stats):
+    def wrap(function):
+        def counted(original, scale, rotate):
+            if scale != 1:
+                stats.count('transform_scale')
+            if rotate != 0:
+                stats.count('transform_rotate')
+            return function(original, scale, rotate)
+        return counted
+    return wrap
+
+
+def _count_rebuilds(stats):
+    def wrap(method):
+        def counted(self):
+            if self._ordered is None:
+                stats.count('order_rebuilds')
+            return method(self)
+        return counted
+    return wrap
+
+
+def enable_stats():
+    """start collecting frame statistics
+
+    enable_stats(): return FrameStats
+
+    The module's hot paths are only instrumented while statistics are
+    enabled, so they cost nothing otherwise. Returns the FrameStats
+    being collected; enabling again returns the same one.
+    """
+    global _stats
+    if _stats is not None:
+        return _stats
+    stats = _stats = FrameStats()
+    module = sys.modules[__name__]
+    wrappers = [
+        (CompactSprite, 'update_image', _count_calls(stats, 'update_image')),
+        (AggregatedSprite, 'update_image',
+         _count_calls(stats, 'update_image')),
+        (CompactSprite, 'on_visual_change', _count_calls(stats, 'hooks')),
+        (CompactSprite, 'draw', _count_blits(stats)),
+        (module, '_blit_moved', _count_blits(stats)),
+        (_LayerOrder, 'ordered', _count_rebuilds(stats)),
+        (AbstractGroup, 'sweep_order', _count_calls(stats, 'sorts')),
+        (CameraGroup, 'visible_sprites', _count_calls(stats, 'sorts')),
+        (module, 'transform_image', _count_transforms(stats)),
+        (module, '_restore', _count_clears(stats)),
+    ]
+    for (cls, phases) in _GROUP_PHASES:
+        for phase in phases:
+            wrappers.append((cls, phase, _time_group_calls(stats, phase)))
+    _instrument('stats', wrappers)
+    return stats
+
+
+def disable_stats():
+    """stop collecting frame statistics
+
+    disable_stats(): return None
+    """
+    global _stats
+    _instrument('stats', None)
+    _stats = None
+
+
+class Tracer(object):
+    """timeline of the sprite module's work, as Chrome trace events
+
+    Tracer(capacity): return Tracer
+
+    Collected while enabled with enable_tracing. Every group update, draw
+    and clear, every update_image, and every time an AggregatedSprite
+    works out its bounds or composite is recorded as a span, along with
+    the class of the sprite or group, and the group being updated, drawn
+    or cleared at the time. Only the last capacity events are
+    kept, so tracing can stay on during a whole session:
+
+        tracer = enable_tracing()
+        while running:
+            ...
+            tracer.mark_frame()
+            if hitch:
+                tracer.write("hitch.json")
+
+    The written file can be opened in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, capacity=65536):
+        self.events = deque(maxlen=capacity)
+        self.pid = os.getpid()
+        self.group = None
+
+    def span(self, name, start, end, args):
+        """record a span, with start and end in default_timer seconds
+        """
+        self.events.append({
+            'name': name, 'ph': 'X', 'pid': self.pid,
+            'tid': threading.current_thread().ident,
+            'ts': start * 1e6, 'dur': (end - start) * 1e6, 'args': args,
+        })
+
+    def mark_frame(self, name='frame'):
+        """record the end of a frame as an instant event
+        """
+        self.events.append({
+            'name': name, 'ph': 'i', 's': 'p', 'pid': self.pid,
+            'tid': threading.current_thread().ident,
+            'ts': default_timer() * 1e6,
+        })
+
+    def write(self, filename):
+        """write the recorded events to a trace file
+
+        Tracer.write(filename): return None
+        """
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': list(self.events),
+                       'displayTimeUnit': 'ms'}, f)
+
+    def clear(self):
+        self.events.clear()
+
+    def __len__(self):
+        return len(self.events)
+
+
+# the Tracer recording
+_tracer = None
+
+
+def _trace_calls(tracer, name, describe):
+    def wrap(method):
+        def traced(self, *args, **kwargs):
+            start = default_timer()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                tracer.span(name, start, default_timer(),
+                            describe(tracer, self))
+        return traced
+    return wrap
+
+
+def _trace_group_calls(tracer, name):
+    def wrap(method):
+        traced = _trace_calls(tracer, name, _describe_group)(method)
+
+        def grouped(group, *args, **kwargs):
+            outer = tracer.group
+            tracer.group = group
+            try:
+                return traced(group, *args, **kwargs)
+            finally:
+                tracer.group = outer
+        return grouped
+    return wrap
+
+
+def _describe_sprite(tracer, sprite):
+    args = {'class': type(sprite).__name__, 'sprite': id(sprite)}
+    if tracer.group is not None:
+        args['group'] = repr(tracer.group)
+    return args
+
+
+def _describe_group(tracer, group):
+    return {'group': repr(group), 'id': id(group)}
+
+
+def enable_tracing(capacity=65536):
+    """start recording a timeline of the module's work
+
+    enable_tracing(capacity = 65536): return Tracer
+
+    Like enable_stats, this instruments the hot paths only while tracing
+    is on. Returns the Tracer recording; enabling again returns the same
+    one.
+    """
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    tracer = _tracer = Tracer(capacity)
+    wrappers = [
+        (CompactSprite, 'update_image',
+         _trace_calls(tracer, 'Sprite.update_image', _describe_sprite)),
+        (AggregatedSprite, 'update_image',
+         _trace_calls(tracer, 'Sprite.update_image', _describe_sprite)),
+        (AggregatedSprite, '_update_bounds',
+         _trace_calls(tracer, 'AggregatedSprite.bounds', _describe_sprite)),
+        (AggregatedSprite, '_build_composite',
+         _trace_calls(tracer, 'AggregatedSprite.composite',
+                      _describe_sprite)),
+    ]
+    for (cls, phases) in _GROUP_PHASES:
+        for phase in phases:
+            wrappers.append(
+                (cls, phase, _trace_group_calls(tracer, 'Group.' + phase)))
+    _instrument('tracing', wrappers)
+    return tracer
+
+
+def disable_tracing():
+    """stop recording the timeline
+
+    disable_tracing(): return None
+
+    The Tracer keeps its events, so they can still be written.
+    """
+    global _tracer
+    _instrument('tracing', None)
+    _tracer = None
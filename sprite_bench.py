@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""benchmarks for the sprite module
+
+Runs headless; usage:
+
+    python sprite_bench.py [--sizes 100,1000] [--json results.json]
+                           [--compare baseline.json] [--threshold 0.2]
+    python sprite_bench.py --memory [count]
+
+Every benchmark is run for each number of sprites, and the best of a few
+repeats is kept; quick ones are called repeatedly and averaged. With
+--json the timings are written to a file, which a later run can be
+compared against with --compare; benchmarks that got slower by more than
+the threshold are flagged, and the exit status is 1.
+"""
+
+import os
+import sys
+import gc
+import json
+import random
+import platform
+import argparse
+import itertools
+import tracemalloc
+from timeit import default_timer
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+# Import new sprite class
+parentdir = os.path.dirname(os.path.abspath(__file__))
+os.sys.path.insert(0, parentdir)
+from sprite import *
+
+SIZES = [100, 1000, 10000, 100000]
+SCREEN_SIZE = (640, 480)
+REPEAT = 3
+MIN_TIME = 0.02
+
+
+def bytes_per_sprite(sprite_class, count, groups):
+    """measure the memory allocated per sprite
+
+    Every sprite gets a shared image and its own position, so its figure
+    includes its rect and position tuple. The second figure is the cost of
+    joining the given groups, back-references included.
+    """
+    image = pygame.Surface((16, 16))
+    gc.collect()
+    tracemalloc.start()
+    sprites = []
+    for i in range(count):
+        spr = sprite_class()
+        spr.set_image(image)
+        spr.move_to((i, i))
+        sprites.append(spr)
+    before = tracemalloc.get_traced_memory()[0]
+    for group in groups:
+        group.add_many(sprites)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (before / float(count), (after - before) / float(count))
+
+
+def memory(count):
+    print("memory per sprite, %d sprites" % count)
+    print("%-14s %8s %14s %14s" % ("class", "groups", "sprite bytes",
+                                   "member bytes"))
+    for sprite_class in [Sprite, CompactSprite]:
+        for groups in [0, 1, 2]:
+            (sprite, group) = bytes_per_sprite(
+                sprite_class, count, [Group() for i in range(groups)])
+            print("%-14s %8d %14.1f %14.1f" % (sprite_class.__name__, groups,
+                                               sprite, group))
+
+
+def make_sprites(count):
+    """return sprites with a shared image, spread over the screen
+    """
+    image = pygame.Surface((16, 16))
+    (width, height) = SCREEN_SIZE
+    rand = random.Random(count)
+    sprites = []
+    for i in range(count):
+        spr = Sprite()
+        spr.set_image(image)
+        spr.move_to((rand.randrange(width), rand.randrange(height)))
+        sprites.append(spr)
+    return sprites
+
+
+def timed(func):
+    """return the seconds a call of func takes
+
+    Calls that are too quick to measure are repeated until they add up to
+    MIN_TIME, and averaged.
+    """
+    number = 1
+    while True:
+        start = default_timer()
+        for i in range(number):
+            func()
+        elapsed = default_timer() - start
+        if elapsed >= MIN_TIME:
+            return elapsed / number
+        number *= 10
+
+
+# Each benchmark takes a sprite count, does its setup, and returns the
+# function to time.
+
+def bench_group_add(count):
+    sprites = make_sprites(count)
+
+    def run():
+        # empty the group again, or the sprites would keep every group
+        # made by the repeated calls
+        group = Group()
+        group.add(*sprites)
+        group.empty()
+    return run
+
+
+def bench_group_remove(count):
+    sprites = make_sprites(count)
+    group = Group(sprites)
+
+    def run():
+        group.remove(*sprites)
+        group.add(*sprites)
+    return run
+
+
+def bench_group_draw(count):
+    group = Group(make_sprites(count))
+    screen = pygame.Surface(SCREEN_SIZE)
+    return lambda: group.draw(screen)
+
+
+def bench_group_update(count):
+    group = Group(make_sprites(count))
+    return group.update
+
+
+def bench_group_clear(count):
+    group = Group(make_sprites(count))
+    screen = pygame.Surface(SCREEN_SIZE)
+    bgd = pygame.Surface(SCREEN_SIZE)
+    group.draw(screen)
+    return lambda: group.clear(screen, bgd)
+
+
+def bench_sprite_move_to(count):
+    sprites = make_sprites(count)
+
+    def run():
+        for spr in sprites:
+            spr.move_to((10, 10))
+    return run
+
+
+def bench_sprite_rotate_to(count):
+    sprites = make_sprites(count)
+    angles = itertools.cycle(range(1, 360))
+
+    def run():
+        angle = next(angles)
+        for spr in sprites:
+            spr.rotate_to(angle)
+    return run
+
+
+def bench_sprite_scale_to(count):
+    sprites = make_sprites(count)
+    ratios = itertools.cycle([1.5, 2, 2.5, 3])
+
+    def run():
+        ratio = next(ratios)
+        for spr in sprites:
+            spr.scale_to(ratio)
+    return run
+
+
+def bench_aggregate_move(count):
+    aggregate = AggregatedSprite()
+    for spr in make_sprites(count):
+        aggregate.add_sprite(spr)
+    aggregate.rect
+
+    def run():
+        aggregate.move_by((1, 1))
+        aggregate.rect
+    return run
+
+
+def bench_aggregate_rotate_draw(count):
+    aggregate = AggregatedSprite()
+    for spr in make_sprites(count):
+        aggregate.add_sprite(spr)
+    screen = pygame.Surface(SCREEN_SIZE)
+    angles = itertools.cycle(range(1, 360))
+
+    def run():
+        aggregate.rotate_to(next(angles))
+        aggregate.draw(screen)
+    return run
+
+
+def bench_layer_cache_draw(count):
+    group = LayerCacheGroup(make_sprites(count))
+    foreground = make_sprites(10)
+    for spr in foreground:
+        spr.layer = 1
+    group.add(*foreground)
+    screen = pygame.Surface(SCREEN_SIZE)
+    bgd = pygame.Surface(SCREEN_SIZE)
+    group.draw(screen)
+
+    def run():
+        for spr in foreground:
+            spr.move_by((1, 0))
+        group.clear(screen, bgd)
+        group.draw(screen)
+    return run
+
+
+BENCHMARKS = [
+    ('group_add', bench_group_add),
+    ('group_remove', bench_group_remove),
+    ('group_draw', bench_group_draw),
+    ('group_update', bench_group_update),
+    ('group_clear', bench_group_clear),
+    ('sprite_move_to', bench_sprite_move_to),
+    ('sprite_rotate_to', bench_sprite_rotate_to),
+    ('sprite_scale_to', bench_sprite_scale_to),
+    ('aggregate_move', bench_aggregate_move),
+    ('aggregate_rotate_draw', bench_aggregate_rotate_draw),
+    ('layer_cache_draw', bench_layer_cache_draw),
+]
+
+
+def run(sizes, names=None):
+    """run the benchmarks, returning {name: {count: seconds}}
+    """
+    results = {}
+    for (name, bench) in BENCHMARKS:
+        if names and name not in names:
+            continue
+        results[name] = {}
+        for count in sizes:
+            func = bench(count)
+            seconds = min(timed(func) for i in range(REPEAT))
+            results[name][str(count)] = seconds
+            print("%-22s %8d %12.6f s" % (name, count, seconds))
+            sys.stdout.flush()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """print the timings next to a baseline, returning the regressions
+    """
+    regressions = []
+    print("")
+    print("%-22s %8s %12s %12s %8s" % ("benchmark", "sprites", "baseline",
+                                       "current", "ratio"))
+    for (name, timings) in sorted(results.items()):
+        for (count, seconds) in sorted(timings.items(),
+                                       key=lambda item: int(item[0])):
+            old = baseline.get(name, {}).get(count)
+            if not old:
+                continue
+            ratio = seconds / old
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "SLOWER"
+                regressions.append((name, count, ratio))
+            print("%-22s %8s %12.6f %12.6f %8.2f %s" % (
+                name, count, old, seconds, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="benchmarks for the sprite module")
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help="comma separated sprite counts")
+    parser.add_argument('--only', default='',
+                        help="comma separated benchmark names")
+    parser.add_argument('--json', help="write the results to a file")
+    parser.add_argument('--compare', help="compare with a saved result file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="slowdown flagged as a regression")
+    parser.add_argument('--memory', nargs='?', type=int, const=100000,
+                        help="measure memory per sprite instead")
+    args = parser.parse_args()
+
+    pygame.init()
+    if args.memory:
+        memory(args.memory)
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    names = [name for name in args.only.split(',') if name]
+    results = run(sizes, names)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'pygame': pygame.version.ver,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("%d regressions" % len(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,15 @@ import unittest
 import pygame
 from pygame.locals import *
 import os
+import sys
+import json
+import tempfile
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Import new sprite class
 parentdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -123,6 +132,874 @@ class SpriteTests(unittest.TestCase):
         self.assertEqual(self.s1.rect.size, ((27, 27)))
 
 
+class DamageRegionTests(unittest.TestCase):
+    def test_merge_overlapping(self):
+        region = DamageRegion(max_waste=0.25)
+        region.add(Rect(0, 0, 10, 10))
+        region.add(Rect(2, 2, 10, 10))
+        region.add(Rect(100, 100, 10, 10))
+        self.assertEqual(sorted(region.rects()),
+                         [Rect(0, 0, 12, 12), Rect(100, 100, 10, 10)])
+
+    def test_merge_adjacent_and_contained(self):
+        region = DamageRegion(max_waste=0)
+        region.add(Rect(0, 0, 10, 10))
+        region.add(Rect(10, 0, 10, 10))
+        region.add(Rect(5, 2, 3, 3))
+        self.assertEqual(region.rects(), [Rect(0, 0, 20, 10)])
+        # an L-shape would waste a quarter of the union
+        region.add(Rect(0, 10, 10, 10))
+        self.assertEqual(len(region), 2)
+
+    def test_slack(self):
+        region = DamageRegion(max_waste=0.5, slack=5)
+        region.add(Rect(0, 0, 10, 10))
+        region.add(Rect(14, 0, 10, 10))
+        self.assertEqual(region.rects(), [Rect(0, 0, 24, 10)])
+
+    def test_group_clear(self):
+        screen = pygame.Surface((50, 50))
+        bgd = pygame.Surface((50, 50))
+        bgd.fill(pygame.Color('white'))
+        cleared = []
+        g = Group()
+        g.damage_waste = 0.25
+        for pos in [(0, 0), (5, 5), (40, 40)]:
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.move_to(pos)
+            g.add(spr)
+        g.draw(screen)
+        g.clear(screen, lambda surf, r: cleared.append(r))
+        self.assertEqual(sorted(cleared),
+                         [Rect(0, 0, 15, 15), Rect(40, 40, 10, 10)])
+        g.clear(screen, bgd)
+        self.assertEqual(screen.get_at((7, 7)), pygame.Color('white'))
+
+
+class SpatialIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.g = Group()
+        self.sprites = []
+        for i in range(10):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.move_to((i * 20, 0))
+            self.sprites.append(spr)
+        self.g.add(self.sprites)
+
+    def check_queries(self):
+        s = self.sprites
+        self.assertEqual(set(self.g.sprites_in_rect(Rect(15, 0, 30, 5))),
+                         set([s[1], s[2]]))
+        self.assertEqual(self.g.sprites_at((45, 5)), [s[2]])
+        self.assertEqual(self.g.sprites_at((55, 5)), [])
+        self.assertEqual(set(self.g.sprites_in_radius((100, 5), 12)),
+                         set([s[4], s[5]]))
+
+    def test_linear_queries(self):
+        self.check_queries()
+
+    def test_indexed_queries(self):
+        index = self.g.enable_spatial_index(32)
+        self.check_queries()
+        self.assertEqual(len(index), 10)
+
+    def test_incremental_update(self):
+        self.g.enable_spatial_index(32)
+        s = self.sprites
+        self.assertEqual(self.g.sprites_at((505, 505)), [])
+        s[3].move_to((500, 500))
+        self.assertEqual(self.g.sprites_at((505, 505)), [s[3]])
+        self.assertEqual(self.g.sprites_at((65, 5)), [])
+        self.g.remove(s[3])
+        self.assertEqual(self.g.sprites_at((505, 505)), [])
+        self.g.empty()
+        self.assertEqual(self.g.sprites_in_rect(Rect(0, 0, 500, 500)), [])
+
+
+class CollisionTests(unittest.TestCase):
+    def make_group(self, count, seed):
+        rng = random.Random(seed)
+        g = Group()
+        for i in range(count):
+            spr = Sprite()
+            spr.rect = Rect(rng.randrange(200), rng.randrange(200),
+                            rng.randrange(1, 30), rng.randrange(1, 30))
+            g.add(spr)
+        return g
+
+    def test_collide(self):
+        g = self.make_group(50, 1)
+        spr = g.sprites()[0]
+        expected = [other for other in g if other is not spr and
+                    spr.rect.colliderect(other.rect)]
+        self.assertEqual(set(g.collide(spr)), set(expected))
+        g.enable_spatial_index(16)
+        self.assertEqual(set(g.collide(spr)), set(expected))
+        self.assertEqual(g.collide(spr, lambda a, b: False), [])
+
+    def test_collide_group(self):
+        g1 = self.make_group(60, 2)
+        g2 = self.make_group(40, 3)
+        for frame in range(3):
+            expected = {}
+            for a in g1:
+                hits = [b for b in g2 if a.rect.colliderect(b.rect)]
+                if hits:
+                    expected[a] = set(hits)
+            crashed = g1.collide_group(g2)
+            self.assertEqual(dict((a, set(b)) for a, b in crashed.items()),
+                             expected)
+            for spr in g1:
+                spr.rect.move_ip(3, 1)
+            g1.remove(g1.sprites()[0])
+
+    def test_collide_pairs(self):
+        g = self.make_group(80, 4)
+        sprites = g.sprites()
+        expected = set()
+        for i, a in enumerate(sprites):
+            for b in sprites[i + 1:]:
+                if a.rect.colliderect(b.rect):
+                    expected.add(frozenset((a, b)))
+        pairs = g.collide_pairs()
+        self.assertEqual(len(pairs), len(expected))
+        self.assertEqual(set(frozenset(p) for p in pairs), expected)
+
+    def test_groupcollide_dokill(self):
+        g1 = self.make_group(30, 5)
+        g2 = self.make_group(30, 6)
+        crashed = groupcollide(g1, g2, True, False)
+        self.assertTrue(crashed)
+        for spr in crashed:
+            self.assertFalse(spr.alive())
+        self.assertEqual(g1.collide_group(g2), {})
+
+
+class MaskCollisionTests(unittest.TestCase):
+    def make_diamond(self, pos):
+        spr = Sprite()
+        square = pygame.Surface((20, 20), pygame.SRCALPHA)
+        square.fill(pygame.Color('red'))
+        spr.set_image(square)
+        spr.anchor = ANCHOR_CENTER
+        spr.move_to(pos)
+        spr.rotate_to(45)
+        return spr
+
+    def test_mask_cached_per_image(self):
+        spr = self.make_diamond((0, 0))
+        mask = spr.get_mask()
+        self.assertIs(spr.get_mask(), mask)
+        spr.rotate_to(30)
+        self.assertIsNot(spr.get_mask(), mask)
+        self.assertEqual(spr.get_mask().get_size(), spr.rect.size)
+
+    def test_collide_mask(self):
+        s1 = self.make_diamond((50, 50))
+        # rects of two diamonds overlap at their corners only
+        s2 = self.make_diamond((74, 74))
+        self.assertTrue(s1.rect.colliderect(s2.rect))
+        self.assertIsNone(collide_mask(s1, s2))
+        s2.move_to((64, 50))
+        self.assertIsNotNone(collide_mask(s1, s2))
+
+    def test_narrow_phase(self):
+        s1 = self.make_diamond((50, 50))
+        s2 = self.make_diamond((74, 74))
+        s3 = self.make_diamond((64, 50))
+        g = Group(s2, s3)
+        self.assertEqual(set(g.collide(s1)), set([s2, s3]))
+        self.assertEqual(g.collide(s1, collide_mask), [s3])
+        self.assertEqual(Group(s1).collide_group(g, collide_mask), {s1: [s3]})
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class SpriteArrayTests(unittest.TestCase):
+    def make_sprites(self):
+        sprites = []
+        for i in range(4):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10 + i, 20)))
+            spr.anchor = ANCHOR_CENTER
+            spr.move_to((i * 30, 10))
+            sprites.append(spr)
+        return sprites
+
+    def test_matches_sprite_methods(self):
+        expected = self.make_sprites()
+        for spr in expected:
+            spr.move_by((5, 7))
+            spr.scale_to(2)
+            spr.rotate_to(30)
+        sprites = self.make_sprites()
+        array = SpriteArray(sprites)
+        array.move_by((5, 7))
+        array.scale_to(2)
+        array.rotate_to(30)
+        self.assertEqual(array.sync(), 4)
+        for (spr, exp) in zip(sprites, expected):
+            self.assertEqual(spr.position, exp.position)
+            self.assertEqual(spr.rect, exp.rect)
+
+    def test_sync_only_changed(self):
+        sprites = self.make_sprites()
+        array = SpriteArray(sprites)
+        g = DirtyGroup(sprites)
+        g.draw(pygame.Surface((200, 200)))
+        self.assertEqual(array.sync(), 0)
+        array.move_to((100, 100), [1, 3])
+        array.visible[0] = False
+        self.assertEqual(array.sync(), 3)
+        self.assertEqual(sprites[1].rect.center, (100, 100))
+        self.assertFalse(sprites[0].visible)
+        self.assertEqual(len(g.draw(pygame.Surface((200, 200)))), 4)
+
+    def test_aggregate_children(self):
+        sprites = self.make_sprites()
+        aggregate = AggregatedSprite()
+        aggregate.move_to((100, 100))
+        for spr in sprites:
+            aggregate.add_sprite(spr)
+        aggregate.update_children()
+        array = SpriteArray(sprites)
+        array.move_by((1, 0))
+        array.rotate_to(90, [2])
+        self.assertEqual(array.sync(), 4)
+        self.assertEqual(sprites[0].position, (1, 10))
+        self.assertEqual(sprites[0].rect.center, (101, 110))
+        self.assertEqual(sprites[2].rect.size, (20, 12))
+        self.assertEqual(sprites[2].rect.center, (161, 110))
+        self.assertEqual(aggregate.rect.left, 96)
+
+
+class DirtyGroupTests(unittest.TestCase):
+    def setUp(self):
+        self.screen = pygame.Surface((100, 100))
+        self.bgd = pygame.Surface((100, 100))
+        self.bgd.fill(pygame.Color('white'))
+        self.s1 = Sprite()
+        self.s1.set_image(pygame.Surface((10, 10)))
+        self.s1.image.fill(pygame.Color('red'))
+        self.s1.move_to((0, 0))
+        self.s2 = Sprite()
+        self.s2.set_image(pygame.Surface((10, 10)))
+        self.s2.image.fill(pygame.Color('blue'))
+        self.s2.move_to((50, 50))
+        self.g = DirtyGroup(self.s1, self.s2)
+        self.g.clear(self.screen, self.bgd)
+
+    def test_draw_only_changes(self):
+        self.assertEqual(len(self.g.draw(self.screen)), 2)
+        self.assertFalse(self.s1.dirty)
+        self.assertEqual(self.g.draw(self.screen), [])
+        self.s1.move_to((20, 0))
+        self.assertEqual(self.g.draw(self.screen),
+                         [Rect(0, 0, 10, 10), Rect(20, 0, 10, 10)])
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('blue'))
+
+    def test_overlapping_redraw(self):
+        self.s2.layer = 1
+        self.g.draw(self.screen)
+        # move s1 under s2, s2 must stay on top
+        self.s1.move_to((45, 45))
+        self.g.draw(self.screen)
+        self.assertEqual(self.screen.get_at((52, 52)), pygame.Color('blue'))
+        self.assertEqual(self.screen.get_at((47, 47)), pygame.Color('red'))
+        self.g.remove(self.s2)
+        self.assertEqual(self.g.draw(self.screen), [Rect(50, 50, 10, 10)])
+        self.assertEqual(self.screen.get_at((52, 52)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((57, 57)), pygame.Color('white'))
+
+
+class StaticTests(unittest.TestCase):
+    def setUp(self):
+        self.screen = pygame.Surface((100, 100))
+        self.bgd = pygame.Surface((100, 100))
+        self.bgd.fill(pygame.Color('white'))
+        self.wall = Sprite()
+        self.wall.set_image(pygame.Surface((10, 10)))
+        self.wall.image.fill(pygame.Color('red'))
+        self.wall.move_to((0, 0))
+        self.wall.layer = 1
+        self.ball = Sprite()
+        self.ball.set_image(pygame.Surface((10, 10)))
+        self.ball.image.fill(pygame.Color('blue'))
+        self.ball.move_to((50, 50))
+
+    def test_clear(self):
+        g = Group(self.wall, self.ball)
+        g.draw(self.screen)
+        g.set_static(self.wall)
+        self.assertTrue(g.is_static(self.wall))
+        background = g.background(self.screen, self.bgd)
+        self.assertIs(g.background(self.screen, self.bgd), background)
+        self.assertEqual(background.get_at((5, 5)), pygame.Color('red'))
+        self.assertEqual(self.bgd.get_at((5, 5)), pygame.Color('white'))
+        g.clear(self.screen, self.bgd)
+        g.draw(self.screen)
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('red'))
+        self.screen.fill(pygame.Color('black'))
+        g.clear(self.screen, self.bgd)
+        g.draw(self.screen)
+        # only the ball was cleared and drawn
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('black'))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('blue'))
+        self.assertEqual(g.spritedict[self.wall], 0)
+        self.wall.move_to((20, 0))
+        g.clear(self.screen, self.bgd)
+        self.assertIsNot(g.background(self.screen, self.bgd), background)
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('red'))
+        g.set_static(self.wall, False)
+        g.clear(self.screen, self.bgd)
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('white'))
+        g.draw(self.screen)
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('red'))
+        self.assertIs(g.background(self.screen, self.bgd), self.bgd)
+
+    def test_change_before_draw(self):
+        for cls in (Group, LayerCacheGroup):
+            frames = []
+            for static in (False, True):
+                self.wall.move_to((5, 0))
+                self.screen.blit(self.bgd, (0, 0))
+                g = cls(self.wall, self.ball)
+                g.set_static(self.wall, static)
+                for i in range(3):
+                    g.clear(self.screen, self.bgd)
+                    # moved between clear and draw, as in an update
+                    self.wall.move_by((10, 0))
+                    g.draw(self.screen)
+                    frames.append(
+                        pygame.image.tostring(self.screen, 'RGB'))
+                g.empty()
+            self.assertEqual(frames[:3], frames[3:])
+            self.assertEqual(self.screen.get_at((35, 5)),
+                             pygame.Color('red'))
+            self.assertEqual(self.screen.get_at((25, 5)),
+                             pygame.Color('white'))
+
+    def test_dirty_group(self):
+        g = DirtyGroup(self.wall, self.ball)
+        g.set_static_layer(1)
+        g.clear(self.screen, self.bgd)
+        g.repaint()
+        g.draw(self.screen)
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('red'))
+        self.assertEqual(g.draw(self.screen), [])
+        self.wall.move_to((20, 0))
+        self.assertEqual(g.draw(self.screen),
+                         [Rect(0, 0, 10, 10), Rect(20, 0, 10, 10)])
+        self.assertEqual(self.screen.get_at((5, 5)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('red'))
+        self.wall.layer = 0
+        self.assertFalse(g.is_static(self.wall))
+        self.ball.layer = 1
+        g.draw(self.screen)
+        self.assertEqual(self.screen.get_at((25, 5)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('blue'))
+        self.assertEqual(g._dynamic_sprites(), [self.wall])
+        g.remove(self.ball)
+        self.assertEqual(g.draw(self.screen), [Rect(50, 50, 10, 10)])
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('white'))
+
+    def test_camera(self):
+        camera = CameraGroup((0, 0, 100, 100), self.wall)
+        self.assertRaises(TypeError, camera.set_static, self.wall)
+        self.assertRaises(TypeError, camera.set_static_layer, 0)
+
+
+class CountedDraw(Sprite):
+    """counts its draw calls"""
+
+    def __init__(self, color, pos, layer):
+        Sprite.__init__(self)
+        self.set_image(pygame.Surface((10, 10)))
+        self.image.fill(pygame.Color(color))
+        self.move_to(pos)
+        self.layer = layer
+        self.draws = 0
+
+    def draw(self, surface):
+        self.draws += 1
+        return Sprite.draw(self, surface)
+
+
+class LayerCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.screen = pygame.Surface((100, 100))
+        self.bgd = pygame.Surface((100, 100))
+        self.bgd.fill(pygame.Color('white'))
+        self.back = CountedDraw('red', (0, 0), 0)
+        self.other = CountedDraw('green', (5, 0), 0)
+        self.front = CountedDraw('blue', (50, 50), 1)
+        self.g = LayerCacheGroup(self.back, self.other, self.front)
+
+    def frame(self):
+        self.g.clear(self.screen, self.bgd)
+        self.g.draw(self.screen)
+
+    def test_cached_layers(self):
+        self.frame()
+        self.assertEqual(self.screen.get_at((2, 2)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((12, 2)), pygame.Color('green'))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('blue'))
+        for i in range(3):
+            self.front.move_by((-10, -10))
+            self.frame()
+        self.assertEqual((self.back.draws, self.other.draws), (1, 1))
+        self.assertEqual(self.front.draws, 4)
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((25, 25)), pygame.Color('blue'))
+        # only the damaged part of the layer is redrawn
+        self.other.move_to((20, 0))
+        self.frame()
+        self.assertEqual((self.back.draws, self.other.draws), (2, 2))
+        self.assertEqual(self.screen.get_at((7, 2)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((12, 2)), pygame.Color('white'))
+        self.front.layer = 0
+        self.frame()
+        self.assertEqual(self.screen.get_at((25, 25)), pygame.Color('blue'))
+        self.g.remove(self.front)
+        self.frame()
+        self.assertEqual(self.screen.get_at((25, 25)), pygame.Color('white'))
+        self.assertEqual(list(self.g._layers), [0])
+
+    def test_uncached_layer(self):
+        self.g.set_cached(1, False)
+        self.frame()
+        self.frame()
+        self.assertEqual((self.back.draws, self.front.draws), (1, 2))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('blue'))
+        self.front.move_to((0, 0))
+        self.frame()
+        self.assertEqual(self.screen.get_at((2, 2)), pygame.Color('blue'))
+        self.assertEqual(self.screen.get_at((55, 55)), pygame.Color('white'))
+
+
+    def test_translucent(self):
+        def render(cls, layers, cached=True):
+            screen = self.bgd.copy()
+            sprites = []
+            colors = [(255, 0, 0, 100), (0, 255, 0, 100)]
+            for (i, layer) in enumerate(layers):
+                spr = Sprite()
+                spr.set_image(pygame.Surface((20, 20), pygame.SRCALPHA))
+                spr.image.fill(colors[i])
+                spr.move_to((i * 10, i * 10))
+                spr.layer = layer
+                sprites.append(spr)
+            g = cls(sprites)
+            if not cached:
+                g.set_cached(0, False)
+            g.draw(screen)
+            return [screen.get_at(pos) for pos in ((5, 5), (15, 15))]
+
+        # translucent sprites match, unless they overlap in one layer
+        self.assertEqual(render(LayerCacheGroup, (0, 1)),
+                         render(Group, (0, 1)))
+        self.assertEqual(render(LayerCacheGroup, (0, 0), cached=False),
+                         render(Group, (0, 0)))
+        (alone, overlap) = render(LayerCacheGroup, (0, 0))
+        self.assertEqual(alone, render(Group, (0, 0))[0])
+        self.assertNotEqual(overlap, render(Group, (0, 0))[1])
+
+
+class CameraGroupTests(unittest.TestCase):
+    def setUp(self):
+        # a draw method taking no offset must not break the camera
+        class Tile(Sprite):
+            def draw(self, surface):
+                drawn.append(self.rect.topleft)
+                return Sprite.draw(self, surface)
+
+        self.drawn = drawn = []
+        self.world = {}
+        self.g = CameraGroup((10, 10, 50, 50), cell_size=32)
+        for x in range(0, 1000, 20):
+            for y in range(0, 1000, 20):
+                tile = Tile(self.g)
+                tile.set_image(pygame.Surface((10, 10)))
+                tile.image.fill(pygame.Color('red'))
+                tile.move_to((x, y))
+                self.world[(x, y)] = tile
+        self.screen = pygame.Surface((100, 100))
+
+    def test_draw_visible(self):
+        self.g.scroll_to((100, 200))
+        self.g.draw(self.screen)
+        self.assertEqual(sorted(spr.position for spr in self.g._drawn),
+                         [(x, y) for x in (100, 120, 140)
+                          for y in (200, 220, 240)])
+        # world (100, 200) is shown at the viewport's topleft
+        self.assertEqual(self.screen.get_at((10, 10)), pygame.Color('red'))
+        self.assertEqual(self.screen.get_at((25, 25)), pygame.Color('black'))
+        # nothing is drawn outside the viewport
+        self.assertEqual(self.screen.get_at((62, 10)), pygame.Color('black'))
+        self.assertEqual(self.world[(100, 200)].rect.topleft, (100, 200))
+        # the tiles' own draw ran with their rects in the viewport
+        self.assertEqual(sorted(self.drawn),
+                         [(x, y) for x in (10, 30, 50) for y in (10, 30, 50)])
+
+    def test_copy(self):
+        self.g.scroll_to((100, 200))
+        camera = self.g.copy()
+        self.assertEqual(camera.viewport, self.g.viewport)
+        self.assertEqual(camera.scroll, (100, 200))
+        self.assertEqual(camera.spatial_index.cell_size, 32)
+        self.assertEqual(len(camera), len(self.g))
+        self.assertEqual(camera.visible_sprites(), self.g.visible_sprites())
+
+    def test_draw_order(self):
+        top = self.world[(120, 20)]
+        top.image.fill(pygame.Color('blue'))
+        top.layer = 1
+        self.world[(100, 0)].move_to((120, 20))
+        self.g.center_on((125, 25))
+        self.g.draw(self.screen)
+        self.assertEqual(list(self.g._drawn)[-1], top)
+        self.assertEqual(self.screen.get_at((35, 35)), pygame.Color('blue'))
+
+    def test_order_without_full_list(self):
+        spawned = Sprite(self.g)
+        spawned.set_image(pygame.Surface((10, 10)))
+        spawned.move_to((105, 205))
+        self.world[(100, 200)].layer = 1
+        self.g.scroll_to((100, 200))
+        self.g.draw(self.screen)
+        # sorting the visible sprites did not rebuild the world's order
+        self.assertEqual(self.g._order._ordered, None)
+        visible = self.g.visible_sprites()
+        self.assertEqual(visible[-2:], [spawned, self.world[(100, 200)]])
+        self.assertEqual(visible, [spr for spr in self.g if spr in visible])
+
+    def test_clear(self):
+        bgd = pygame.Surface((100, 100))
+        bgd.fill(pygame.Color('white'))
+        self.g.draw(self.screen)
+        self.g.scroll_by((5, 0))
+        self.g.clear(self.screen, bgd)
+        self.assertEqual(self.screen.get_at((10, 10)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((75, 75)), pygame.Color('black'))
+        self.g.draw(self.screen)
+        self.assertEqual(self.screen.get_at((17, 10)), pygame.Color('white'))
+        self.assertEqual(self.screen.get_at((25, 10)), pygame.Color('red'))
+        self.assertEqual(self.g.to_world((25, 10)), (20, 0))
+
+
+class TransformCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = TransformCache(angle_step=10)
+        self.original = pygame.Surface((10, 20))
+
+    def tearDown(self):
+        Sprite.transform_cache = None
+
+    def test_bake(self):
+        Sprite.transform_cache = self.cache
+        for future in self.cache.bake(self.original, frames=8):
+            future.result()
+        self.assertEqual(self.cache.stats()['frames'], 8)
+        spr = Sprite()
+        spr.set_image(self.original)
+        # snapped to the nearest frame, 45 degrees
+        spr.rotate_to(50)
+        self.assertIs(spr.image, self.cache.get(self.original, 1, 40))
+        self.assertEqual(spr.rect.size,
+                         transform_image(self.original, 1, 45).get_size())
+        self.assertEqual(self.cache.misses, 0)
+        # scales that were not baked are transformed as usual
+        spr.scale_to(2)
+        self.assertEqual(self.cache.misses, 1)
+        self.cache.unbake(self.original)
+        self.assertEqual(self.cache.stats()['frames'], 0)
+
+    def test_blit_while_baking(self):
+        class PendingExecutor(object):
+            # holds the jobs, with their source locked as if a worker
+            # thread was rotating it
+            def __init__(self):
+                self.jobs = []
+
+            def submit(self, fn, *args):
+                args[0].lock()
+                self.jobs.append((fn, args))
+
+            def run(self):
+                for (fn, args) in self.jobs:
+                    args[0].unlock()
+                    fn(*args)
+
+        executor = PendingExecutor()
+        self.cache.bake(self.original, frames=8, executor=executor)
+        screen = pygame.Surface((40, 40))
+        screen.blit(self.original, (0, 0))
+        self.assertFalse(self.original.get_locked())
+        executor.run()
+        self.assertEqual(self.cache.stats()['frames'], 8)
+
+    def test_hits_and_misses(self):
+        img = self.cache.get(self.original, 2, 90)
+        self.assertEqual(img.get_size(), (40, 20))
+        self.assertIs(self.cache.get(self.original, 2, 92), img)
+        self.assertIs(self.cache.get(self.original, 1, 0), self.original)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['bytes'], img.get_pitch() * 20)
+
+    def test_eviction(self):
+        self.cache.max_bytes = 1
+        self.cache.get(self.original, 2, 0)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        # each 20x40 image takes 3200 bytes
+        self.cache.max_bytes = 5000
+        self.cache.get(self.original, 2, 0)
+        self.cache.get(self.original, 2, 90)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_shared_between_sprites(self):
+        Sprite.transform_cache = self.cache
+        s1 = Sprite()
+        s1.set_image(self.original)
+        s1.move_to((0, 0))
+        s2 = Sprite()
+        s2.set_image(self.original)
+        s2.move_to((0, 0))
+        s1.rotate_to(45)
+        s2.rotate_to(45)
+        self.assertIs(s1.image, s2.image)
+        self.assertEqual(s1.rect.size, s2.image.get_size())
+
+
+class TextureAtlasTests(unittest.TestCase):
+    def setUp(self):
+        self.atlas = TextureAtlas((100, 100))
+
+    def test_load_once(self):
+        ball = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'demos', 'data', 'ball.png')
+        images = [self.atlas.load(ball, -1) for i in range(100)]
+        self.assertTrue(all(image is images[0] for image in images))
+        self.assertEqual(images[0].get_size(),
+                         pygame.image.load(ball).get_size())
+        # the colorkey became transparent pixels
+        self.assertEqual(images[0].get_at((0, 0)).a, 0)
+        stats = self.atlas.stats()
+        self.assertEqual((stats['images'], stats['requests']), (1, 100))
+        self.assertGreater(stats['saved_bytes'], 0)
+
+    def test_color_keys(self):
+        ball = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'demos', 'data', 'ball.png')
+        image = self.atlas.load(ball, pygame.Color(255, 255, 255))
+        self.assertIs(self.atlas.load(ball, (255, 255, 255)), image)
+        self.assertIs(self.atlas.load(ball, 'white'), image)
+        self.assertIs(self.atlas.get((ball, (255, 255, 255, 255))), image)
+        self.assertEqual(self.atlas.stats()['images'], 1)
+
+    def test_packing(self):
+        images = []
+        for i in range(12):
+            surface = pygame.Surface((30, 20 + i % 3))
+            surface.fill((i, i, i))
+            images.append(self.atlas.add(i, surface))
+        rects = [pygame.Rect(image.get_offset(), image.get_size())
+                 for image in images]
+        sheets = [image.get_parent() for image in images]
+        for (i, rect) in enumerate(rects):
+            self.assertEqual(images[i].get_at((29, 19)), (i, i, i))
+            for j in range(i):
+                if sheets[i] is sheets[j]:
+                    self.assertFalse(rect.colliderect(rects[j]))
+        self.assertEqual(len(self.atlas.sheets), 2)
+        # images larger than a sheet get a sheet of their own
+        large = self.atlas.add('large', pygame.Surface((150, 10)))
+        self.assertEqual(large.get_parent().get_size(), (151, 100))
+        self.assertIs(self.atlas.add(0, None), images[0])
+
+
+class RotateCounter(object):
+    """mixin counting the calls to pygame.transform.rotate"""
+
+    def setUp(self):
+        self.image = pygame.Surface((20, 10), pygame.SRCALPHA)
+        self.image.fill(pygame.Color('red'), Rect(0, 0, 10, 10))
+        self.image.fill(pygame.Color('blue'), Rect(10, 0, 10, 10))
+        self.rotations = 0
+        self.rotate = pygame.transform.rotate
+
+        def counting_rotate(img, angle):
+            self.rotations += 1
+            return self.rotate(img, angle)
+        pygame.transform.rotate = counting_rotate
+
+    def tearDown(self):
+        pygame.transform.rotate = self.rotate
+
+    sprite_class = Sprite
+
+    def make_sprite(self):
+        spr = self.sprite_class()
+        spr.set_image(self.image)
+        spr.anchor = ANCHOR_CENTER
+        spr.move_to((50, 50))
+        return spr
+
+    def change(self, spr):
+        spr.scale_by(0.5)
+        spr.rotate_by(30)
+        spr.rotate_by(15)
+        spr.move_to((60, 40))
+
+
+class BatchTests(RotateCounter, unittest.TestCase):
+    def test_matches_unbatched(self):
+        expected = self.make_sprite()
+        self.change(expected)
+        self.rotations = 0
+        spr = self.make_sprite()
+        g = DirtyGroup(spr)
+        g.draw(pygame.Surface((100, 100)))
+        with spr.batch():
+            self.change(spr)
+            self.assertEqual(g.draw(pygame.Surface((100, 100))), [])
+        self.assertEqual(self.rotations, 1)
+        self.assertEqual(spr.rect, expected.rect)
+        self.assertEqual(pygame.image.tostring(spr.image, 'RGBA'),
+                         pygame.image.tostring(expected.image, 'RGBA'))
+        self.assertEqual(len(g.draw(pygame.Surface((100, 100)))), 1)
+
+    def test_group_batch(self):
+        sprites = [self.make_sprite() for i in range(3)]
+        aggregate = AggregatedSprite()
+        aggregate.add_sprite(self.make_sprite())
+        g = Group(sprites, aggregate)
+        self.rotations = 0
+        with g.batch():
+            for spr in g:
+                spr.rotate_by(10)
+                spr.rotate_by(10)
+        self.assertEqual(self.rotations, 4)
+        self.assertEqual(aggregate.sprites[0].world_transform()[2], 20)
+
+
+class LazySpriteTests(RotateCounter, unittest.TestCase):
+    sprite_class = LazySprite
+
+    def test_transform_on_access(self):
+        spr = self.make_sprite()
+        self.rotations = 0
+        self.change(spr)
+        spr.rotate_by(5)
+        self.assertEqual(self.rotations, 0)
+        expected = Sprite()
+        expected.set_image(self.image)
+        expected.anchor = ANCHOR_CENTER
+        expected.move_to((50, 50))
+        self.change(expected)
+        expected.rotate_by(5)
+        self.assertEqual(spr.rect, expected.rect)
+        self.assertEqual(pygame.image.tostring(spr.image, 'RGBA'),
+                         pygame.image.tostring(expected.image, 'RGBA'))
+
+    def test_hidden_sprites_skip_transform(self):
+        sprites = [self.make_sprite() for i in range(3)]
+        g = Group(sprites)
+        sprites[0].make_invisible()
+        self.rotations = 0
+        for spr in sprites:
+            spr.rotate_by(10)
+        g.draw(pygame.Surface((100, 100)))
+        self.assertEqual(self.rotations, 2)
+
+    def test_hidden_sprites_skip_transform_in_dirty_group(self):
+        sprites = [self.make_sprite() for i in range(5)]
+        g = DirtyGroup(sprites)
+        g.draw(pygame.Surface((100, 100)))
+        for spr in sprites[1:]:
+            spr.make_invisible()
+        self.rotations = 0
+        for spr in sprites:
+            spr.rotate_by(10)
+        g.draw(pygame.Surface((100, 100)))
+        self.assertEqual(self.rotations, 1)
+
+    def test_culled_sprites_skip_transform(self):
+        sprites = [self.make_sprite() for i in range(4)]
+        sprites[1].move_to((500, 500))
+        sprites[2].move_to((78, 50))
+        sprites[3].make_invisible()
+        camera = CameraGroup((0, 0, 60, 60), sprites)
+        self.rotations = 0
+        for spr in sprites:
+            spr.rotate_by(45)
+        camera.draw(pygame.Surface((60, 60)))
+        # the third one is found by its estimated rect, then transformed
+        # to find that it is out of view after all
+        self.assertEqual(self.rotations, 2)
+        self.assertEqual(camera.visible_sprites(), [sprites[0]])
+        self.assertEqual(camera.sprites_at((500, 500)), [sprites[1]])
+        self.assertEqual(self.rotations, 3)
+
+    def test_plain_sprites_have_plain_attributes(self):
+        for cls in (Sprite, CompactSprite):
+            self.assertNotIsInstance(cls.rect, property)
+            self.assertNotIsInstance(cls.image, property)
+        self.assertIsInstance(LazySprite.rect, property)
+        self.assertIsInstance(LazyCompactSprite.image, property)
+
+    def test_move_before_image(self):
+        spr = LazySprite()
+        spr.move_to((5, 5))
+        spr.set_image(self.image)
+        self.assertEqual(spr.rect.topleft, (5, 5))
+
+
+class CompactSpriteTests(unittest.TestCase):
+    def setUp(self):
+        self.s = CompactSprite()
+        self.s.set_image(pygame.Surface((10, 10)))
+        self.s.move_to((5, 5))
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(self.s, '__dict__'))
+        self.assertRaises(AttributeError, setattr, self.s, 'foo', 1)
+
+    def test_group_membership(self):
+        g1, g2, g3 = Group(), Group(), Group()
+        self.assertFalse(self.s.alive())
+        g1.add(self.s)
+        self.assertEqual(self.s.groups(), [g1])
+        self.s.add(g2, g3)
+        self.assertEqual(set(self.s.groups()), set([g1, g2, g3]))
+        g1.remove(self.s)
+        g2.remove(self.s)
+        self.assertEqual(self.s.groups(), [g3])
+        self.assertTrue(self.s in g3)
+        self.s.add(g1)
+        self.s.kill()
+        self.assertFalse(self.s.alive())
+        self.assertEqual((len(g1), len(g3)), (0, 0))
+
+    def test_hooks_and_aggregate(self):
+        g = DirtyGroup(self.s)
+        g.draw(pygame.Surface((50, 50)))
+        self.s.scale_to(2)
+        self.s.move_by((1, 1))
+        self.assertEqual(self.s.rect, Rect(6, 6, 20, 20))
+        self.assertEqual(len(g.draw(pygame.Surface((50, 50)))), 1)
+        aggregate = AggregatedSprite()
+        aggregate.add_sprite(self.s)
+        aggregate.move_to((10, 10))
+        aggregate.update_children()
+        self.assertEqual(self.s.rect.topleft, (16, 16))
+
+
 class AggregatedSpriteTests(unittest.TestCase):
     def setUp(self):
         self.s = AggregatedSprite()
@@ -140,8 +1017,209 @@ class AggregatedSpriteTests(unittest.TestCase):
         self.assertEqual(self.s.sprites, [s1, s2])
 
     def test_draw(self):
-        #TODO
-        pass
+        self.make_formation()
+        (red, green, blue) = self.s.sprites
+        green.move_to((0, 0))
+        surface = pygame.Surface((100, 100))
+        self.s.draw(surface)
+        self.assertEqual(surface.get_at((25, 25)), pygame.Color('green'))
+        green.layer = -1
+        self.s.draw(surface)
+        self.assertEqual(surface.get_at((25, 25)), pygame.Color('red'))
+
+    def test_bounds(self):
+        self.make_formation()
+        (red, green, blue) = self.s.sprites
+        self.assertEqual(self.s.rect, Rect(20, 20, 40, 20))
+        # growing past the border, moving inside and shrinking back
+        blue.move_by((10, 0))
+        self.assertEqual(self.s.rect, Rect(20, 20, 50, 20))
+        green.move_by((0, 1))
+        self.assertEqual(self.s.rect, Rect(20, 20, 50, 20))
+        blue.move_by((-30, 0))
+        self.assertEqual(self.s.rect, Rect(20, 20, 25, 20))
+        blue.toggle_visibility()
+        self.assertEqual(self.s.rect, Rect(20, 20, 25, 16))
+        self.s.remove_sprite(red)
+        self.assertEqual(self.s.rect, Rect(35, 26, 10, 10))
+        self.s.move_by((5, 5))
+        self.assertEqual(self.s.rect, Rect(40, 31, 10, 10))
+
+    def test_bounds_in_dirty_group(self):
+        self.make_formation()
+        group = DirtyGroup(self.s)
+        surface = pygame.Surface((100, 100))
+        group.clear(surface, pygame.Surface((100, 100)))
+        group.draw(surface)
+        self.s.sprites[2].move_by((10, 0))
+        # the aggregate is damaged as a whole
+        self.assertEqual(group.draw(surface), [Rect(20, 20, 50, 20)])
+        self.assertEqual(surface.get_at((55, 35)), pygame.Color('black'))
+
+    def test_drawn_rect(self):
+        spr = Sprite()
+        spr.set_image(pygame.Surface((10, 10)))
+        spr.move_to((0, 0))
+        self.s.add_sprite(spr)
+        self.s.move_to((200, 200))
+        screen = pygame.Surface((300, 300))
+        group = Group(self.s)
+        group.draw(screen)
+        self.assertEqual(group.spritedict[self.s], Rect(200, 200, 10, 10))
+        camera = CameraGroup((0, 0, 300, 300), self.s)
+        camera.scroll_to((150, 150))
+        camera.draw(screen)
+        self.assertEqual(camera.spritedict[self.s], Rect(50, 50, 10, 10))
+        spr.toggle_visibility()
+        self.assertEqual(self.s.draw(screen), 0)
+
+    def make_formation(self):
+        self.images = []
+        for (i, color) in enumerate(['red', 'green', 'blue']):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.image.fill(pygame.Color(color))
+            spr.move_to((i * 15, i * 5))
+            self.s.add_sprite(spr)
+        self.s.move_to((20, 20))
+
+    def render(self):
+        surface = pygame.Surface((100, 100))
+        self.s.draw(surface)
+        return pygame.image.tostring(surface, 'RGB')
+
+    def test_flatten(self):
+        self.make_formation()
+        expected = self.render()
+        self.s.flatten()
+        self.assertEqual(self.s.rect, Rect(20, 20, 40, 20))
+        self.assertEqual(self.render(), expected)
+        self.s.move_by((5, 5))
+        self.assertEqual(self.s.rect.topleft, (25, 25))
+        # the composite is scaled around the aggregate's position, just
+        # like the children
+        self.s.scale_to(2)
+        self.assertEqual(self.s.rect, Rect(25, 25, 80, 40))
+        expected = self.render()
+        self.s.unflatten()
+        self.assertEqual(self.s.rect, Rect(25, 25, 80, 40))
+        self.assertEqual(self.render(), expected)
+
+    def test_flatten_child_change(self):
+        self.make_formation()
+        self.s.flatten()
+        composite = self.s.image
+        self.s.sprites[2].move_by((10, 0))
+        self.assertTrue(self.s.dirty)
+        self.assertIsNot(self.s.image, composite)
+        self.assertEqual(self.s.rect, Rect(20, 20, 50, 20))
+
+    def test_unflatten(self):
+        self.make_formation()
+        self.s.flatten()
+        self.s.move_to((30, 20))
+        self.s.rotate_to(90)
+        self.s.unflatten()
+        self.s.update_children()
+        self.assertEqual(self.s.sprites[1].rect.topleft, (35, 5))
+        self.assertEqual(self.s.sprites[1].world_transform()[2], 90)
+
+    def test_flatten_rotate_unflatten(self):
+        for anchor in (ANCHOR_CENTER, ANCHOR_TOPLEFT):
+            self.s = AggregatedSprite()
+            self.make_formation()
+            for spr in self.s.sprites:
+                spr.anchor = anchor
+                spr.update_position()
+            self.s.rotate_to(90)
+            expected = self.s.rect.copy()
+            self.s.rotate_to(0)
+            self.s.flatten()
+            self.s.rotate_to(90)
+            flat = self.s.rect.copy()
+            self.s.unflatten()
+            # back to where the children place themselves
+            self.assertEqual(self.s.rect, expected)
+            if anchor == ANCHOR_CENTER:
+                self.assertEqual(flat, expected)
+            else:
+                # the composite turns around its pixels, each child
+                # around the corner of its own rotated image
+                self.assertEqual(flat.size, expected.size)
+                self.assertEqual(flat, Rect(20, -20, 20, 40))
+                self.assertEqual(expected, Rect(20, -10, 20, 40))
+
+    def test_nested_transform(self):
+        inner = AggregatedSprite()
+        inner.move_to((10, 0))
+        spr = Sprite()
+        spr.set_image(pygame.Surface((4, 2)))
+        spr.anchor = ANCHOR_CENTER
+        spr.move_to((5, 0))
+        inner.add_sprite(spr)
+        self.s.add_sprite(inner)
+        self.s.move_to((50, 50))
+        self.s.update_children()
+        self.assertEqual(spr.rect.center, (65, 50))
+        self.s.rotate_to(90)
+        self.assertEqual(spr.world_transform(), ((50, 35), 1, 90))
+        self.s.draw(pygame.Surface((100, 100)))
+        self.assertEqual(spr.rect.size, (2, 4))
+        inner.scale_to(2)
+        self.s.update_children()
+        self.assertEqual(spr.world_transform(), ((50, 30), 2, 90))
+        self.assertEqual(spr.rect.size, (4, 8))
+        self.s.remove_sprite(inner)
+        self.assertEqual(spr.world_transform(), ((20, 0), 2, 0))
+
+    def test_children_with_own_draw(self):
+        drawn = []
+
+        class Marker(Sprite):
+            def draw(self, surface):
+                drawn.append(self)
+                return Sprite.draw(self, surface)
+
+        spr = Marker()
+        spr.set_image(pygame.Surface((10, 10)))
+        spr.image.fill(pygame.Color('red'))
+        spr.move_to((0, 0))
+        self.s.add_sprite(spr)
+        self.s.move_to((20, 20))
+        screen = pygame.Surface((50, 50))
+        Group(self.s).draw(screen)
+        self.assertEqual(drawn, [spr])
+        self.s.flatten()
+        self.s.draw(screen)
+        self.assertEqual(screen.get_at((25, 25)), pygame.Color('red'))
+
+    def test_move_tree(self):
+        moved = []
+
+        class Leaf(Sprite):
+            def update_position(self):
+                moved.append(self)
+                Sprite.update_position(self)
+
+        for i in range(10):
+            branch = AggregatedSprite()
+            branch.move_to((i * 10, 0))
+            for j in range(100):
+                leaf = Leaf()
+                leaf.set_image(pygame.Surface((2, 2)))
+                leaf.move_to((0, j))
+                branch.add_sprite(leaf)
+            self.s.add_sprite(branch)
+        rect = self.s.rect.copy()
+        del moved[:]
+        # moving the tree touches neither the branches nor the leaves
+        for i in range(10):
+            self.s.move_by((1, 2))
+        self.assertEqual(self.s.rect, rect.move(10, 20))
+        self.assertEqual(moved, [])
+        self.s.draw(pygame.Surface((200, 200)))
+        self.assertEqual(len(moved), 1000)
+        self.assertEqual(leaf.rect.topleft, (100, 119))
 
     def test_propagate(self):
         # prepare sprites
@@ -161,19 +1239,342 @@ class AggregatedSpriteTests(unittest.TestCase):
         self.assertEqual(s2.rect.size, (23, 23))
         # propagate move events
         self.s.move_to((6, 6))
+        self.s.update_children()
         self.assertEqual(s1.rect.topleft, (6, 6))
         self.assertEqual(s2.rect.topleft, (9, 9))
         self.s.move_by((1, 3))
+        self.s.update_children()
         self.assertEqual(s1.rect.topleft, (7, 9))
         self.assertEqual(s2.rect.topleft, (10, 12))
         # propagate scale events
         self.s.scale_to(3)
+        self.s.update_children()
         self.assertEqual(s1.rect.size, (30, 30))
         self.assertEqual(s2.rect.size, (69, 69))
         self.s.scale_by(2)
+        self.s.update_children()
         self.assertEqual(s1.rect.size, (50, 50))
         self.assertEqual(s2.rect.size, (115, 115))
 
 
+class FrameStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.draw = CompactSprite.draw
+        self.stats = enable_stats()
+
+    def tearDown(self):
+        disable_stats()
+
+    def test_counters(self):
+        screen = pygame.Surface((100, 100))
+        sprites = []
+        for i in range(3):
+            spr = Sprite()
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.move_to((i * 20, 0))
+            sprites.append(spr)
+        g = Group(sprites)
+        other = DirtyGroup(Sprite())
+        sprites[0].rotate_to(90)
+        g.update()
+        g.draw(screen)
+        g.clear(screen, screen.copy())
+        other.draw(screen)
+        frame = self.stats.end_frame()
+        counters = frame['counters']
+        self.assertEqual(counters['update_image'], 4)
+        self.assertEqual(counters['transform_rotate'], 1)
+        self.assertEqual(counters['hooks'], 7)
+        self.assertEqual(counters['blits'], 3)
+        self.assertEqual(counters['pixels_drawn'], 300)
+        self.assertEqual(counters['clears'], 3)
+        self.assertEqual(counters['pixels_cleared'], 300)
+        self.assertEqual(counters['draw'], 2)
+        self.assertGreaterEqual(counters['draw_time'], 0)
+        self.assertEqual(frame['groups'][g]['blits'], 3)
+        self.assertEqual(frame['groups'][other]['draw'], 1)
+        self.assertNotIn('blits', frame['groups'][other])
+        self.assertEqual(self.stats.end_frame()['counters'], {})
+        self.assertEqual(self.stats.totals['blits'], 3)
+
+    def test_sorts(self):
+        camera = CameraGroup((0, 0, 100, 100))
+        for i in range(3):
+            spr = Sprite(camera)
+            spr.set_image(pygame.Surface((10, 10)))
+            spr.move_to((i * 20, 0))
+        camera.draw(pygame.Surface((100, 100)))
+        camera.sweep_order()
+        camera.sweep_order()
+        counters = self.stats.end_frame()['counters']
+        self.assertEqual(counters['sorts'], 3)
+        self.assertEqual(counters['order_rebuilds'], 1)
+
+    def test_disable(self):
+        self.assertIsNot(CompactSprite.draw, self.draw)
+        self.assertIs(enable_stats(), self.stats)
+        disable_stats()
+        self.assertIs(CompactSprite.draw, self.draw)
+        Group(Sprite()).update()
+        self.assertEqual(self.stats.counters, {})
+
+
+class TracerTests(unittest.TestCase):
+    def setUp(self):
+        self.tracer = enable_tracing(capacity=8)
+
+    def tearDown(self):
+        disable_tracing()
+
+    def test_spans(self):
+        aggregate = AggregatedSprite()
+        spr = Sprite()
+        spr.set_image(pygame.Surface((10, 10)))
+        aggregate.add_sprite(spr)
+        g = Group(aggregate)
+        aggregate.rotate_to(90)
+        aggregate.rect
+        g.draw(pygame.Surface((100, 100)))
+        self.tracer.mark_frame()
+        events = list(self.tracer.events)
+        # spans are recorded as they end, so the child's update comes
+        # before the bounds it was needed for
+        self.assertEqual([event['name'] for event in events],
+                         ['Sprite.update_image', 'Sprite.update_image',
+                          'Sprite.update_image', 'AggregatedSprite.bounds',
+                          'Group.draw', 'frame'])
+        self.assertEqual([event['args']['class'] for event in events[:4]],
+                         ['Sprite', 'AggregatedSprite', 'Sprite',
+                          'AggregatedSprite'])
+        self.assertEqual(events[4]['args']['group'], repr(g))
+        self.assertGreaterEqual(events[4]['dur'], 0)
+        # the ring buffer keeps the last events
+        for i in range(10):
+            g.update()
+        self.assertEqual(len(self.tracer), 8)
+        (fd, filename) = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            self.tracer.write(filename)
+            with open(filename) as f:
+                events = json.load(f)['traceEvents']
+        finally:
+            os.remove(filename)
+        self.assertEqual(len(events), 8)
+        self.assertEqual(events[-1]['name'], 'Group.update')
+
+    def test_update_image_group(self):
+        spr = LazySprite()
+        spr.set_image(pygame.Surface((10, 10)))
+        g = Group(spr)
+        spr.rotate_to(90)
+        g.draw(pygame.Surface((100, 100)))
+        (update, draw) = list(self.tracer.events)[-2:]
+        self.assertEqual(update['name'], 'Sprite.update_image')
+        self.assertEqual(update['args']['group'], repr(g))
+        self.assertEqual(draw['name'], 'Group.draw')
+        self.assertIsNone(self.tracer.group)
+
+    def test_disable_in_any_order(self):
+        module = sys.modules[Sprite.__module__]
+        disable_tracing()
+        originals = [module.transform_image, module._blit_moved,
+                     AbstractGroup.__dict__['draw'],
+                     CompactSprite.__dict__['update_image']]
+        self.tracer = enable_tracing()
+        stats = enable_stats()
+        try:
+            spr = Sprite()
+            g = Group(spr)
+            spr.set_image(pygame.Surface((10, 10)))
+            g.draw(pygame.Surface((100, 100)))
+            self.assertEqual(stats.counters['update_image'], 1)
+            self.assertEqual(stats.counters['draw'], 1)
+            self.assertEqual([event['name'] for event in self.tracer.events],
+                             ['Sprite.update_image', 'Group.draw'])
+        finally:
+            # tracing was enabled first, and is disabled first
+            disable_tracing()
+        spr.rotate_to(45)
+        self.assertEqual(stats.counters['update_image'], 2)
+        self.assertEqual(len(self.tracer), 2)
+        disable_stats()
+        self.assertEqual([module.transform_image, module._blit_moved,
+                          AbstractGroup.__dict__['draw'],
+                          CompactSprite.__dict__['update_image']],
+                         originals)
+
+
+class Walker(Sprite):
+    """moves itself by a step in update, and returns its new x"""
+
+    def __init__(self, x):
+        Sprite.__init__(self)
+        self.set_image(pygame.Surface((4, 4)))
+        self.move_to((x, 0))
+        self.applied = None
+
+    def update(self, step):
+        self.move_by((step, 0))
+        return self.position[0]
+
+    def update_state(self):
+        return self.position[0]
+
+    def apply_update(self, result):
+        self.applied = result
+        self.move_to((result, self.position[1]))
+
+
+def walk(x, step):
+    return x + step
+
+
+class ParallelUpdateTests(unittest.TestCase):
+    def setUp(self):
+        self.sprites = [Walker(i) for i in range(10)]
+        self.g = DirtyGroup(self.sprites)
+        screen = pygame.Surface((40, 20))
+        self.g.draw(screen)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(4) as executor:
+            self.g.update_parallel(executor, 2, chunk_size=3)
+        self.assertEqual([spr.applied for spr in self.sprites],
+                         list(range(2, 12)))
+        self.assertEqual([spr.rect.x for spr in self.sprites],
+                         list(range(2, 12)))
+        self.assertEqual(len(self.g._changed), 10)
+
+    def test_processes(self):
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(2) as executor:
+            self.g.update_parallel(executor, 5, chunk_size=4,
+                                   function=walk)
+        self.assertEqual([spr.position[0] for spr in self.sprites],
+                         list(range(5, 15)))
+
+    def test_errors(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self.sprites[7].update = lambda step: 1 // 0
+        self.sprites[2].update = lambda step: [][0]
+        with ThreadPoolExecutor(4) as executor:
+            self.assertRaises(IndexError, self.g.update_parallel,
+                              executor, 1, chunk_size=2)
+        self.assertEqual(self.sprites[0].applied, None)
+        self.assertFalse(self.sprites[0]._batch)
+
+
+class Counter(Sprite):
+    """counts its updates"""
+
+    def __init__(self, *groups):
+        Sprite.__init__(self, *groups)
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+
+class SleepTests(unittest.TestCase):
+    def setUp(self):
+        self.sprites = [Counter() for i in range(4)]
+        self.g = Group(self.sprites)
+
+    def counts(self):
+        return [spr.updates for spr in self.sprites]
+
+    def test_sleep_and_wake(self):
+        self.sprites[1].sleep()
+        self.sprites[2].sleep(2)
+        self.assertEqual(self.g.sleeping(), self.sprites[1:3])
+        for i in range(3):
+            self.g.update()
+        self.assertEqual(self.counts(), [3, 0, 1, 3])
+        self.assertEqual(self.g.sleeping(), [self.sprites[1]])
+        self.sprites[1].wake()
+        self.g.update()
+        self.assertEqual(self.counts(), [4, 1, 2, 4])
+        self.assertEqual(self.g.sleeping(), [])
+        self.assertEqual(self.g._awake, None)
+
+    def test_update_interval(self):
+        self.sprites[0].set_update_interval(3)
+        self.sprites[3].update_interval = 2
+        self.g.remove(self.sprites[3])
+        self.g.add(self.sprites[3])
+        for i in range(6):
+            self.g.update()
+        self.assertEqual(self.counts(), [2, 6, 6, 3])
+        self.sprites[0].set_update_interval(1)
+        self.sprites[0].wake()
+        self.g.update()
+        self.g.update()
+        self.assertEqual(self.counts()[0], 4)
+
+    def test_membership(self):
+        self.sprites[0].sleep()
+        self.sprites[1].sleep(1)
+        self.sprites[0].layer = 1
+        self.g.remove(self.sprites[1])
+        self.g.update()
+        self.g.add(self.sprites[1])
+        self.g.update()
+        self.assertEqual(self.counts(), [0, 1, 2, 2])
+        self.sprites[0].wake()
+        self.assertEqual(self.g.sprites()[-1], self.sprites[0])
+        self.g.empty()
+        self.g.add(self.sprites)
+        self.g.update()
+        self.assertEqual(self.counts(), [1, 2, 3, 3])
+
+
+class GroupTests(unittest.TestCase):
+    def setUp(self):
+        self.s1 = Sprite()
+        self.s2 = Sprite()
+        self.s3 = Sprite()
+        self.s1.layer = 2
+        self.s2.layer = 0
+        self.s3.layer = 1
+        self.g = Group(self.s1, self.s2, self.s3)
+
+    def test_layer_order(self):
+        self.assertEqual(self.g.sprites(), [self.s2, self.s3, self.s1])
+        self.assertEqual(list(self.g), [self.s2, self.s3, self.s1])
+
+    def test_change_layer(self):
+        self.s2.layer = 3
+        self.assertEqual(self.g.sprites(), [self.s3, self.s1, self.s2])
+        self.s1.layer = -1
+        self.assertEqual(self.g.sprites(), [self.s1, self.s3, self.s2])
+        self.g.remove(self.s3)
+        self.assertEqual(self.g.sprites(), [self.s1, self.s2])
+        self.s3.layer = 5
+        self.assertEqual(self.g.sprites(), [self.s1, self.s2])
+
+    def test_add_remove_many(self):
+        g = Group()
+        self.assertFalse(g)
+        sprites = [Sprite() for i in range(5)]
+        g.add_many(sprites)
+        g.add_many(sprites[:2])
+        self.assertEqual(len(g), 5)
+        self.assertTrue(g)
+        self.assertEqual(sprites[0].groups(), [g])
+        g.remove_many(sprites[1:4])
+        self.assertEqual(g.sprites(), [sprites[0], sprites[4]])
+        self.assertFalse(sprites[1].alive())
+
+    def test_empty(self):
+        self.g.empty()
+        self.assertEqual(len(self.g), 0)
+        self.assertEqual(self.g.sprites(), [])
+        self.assertFalse(self.s1.alive())
+        self.g.add(self.s1)
+        self.assertEqual(self.g.sprites(), [self.s1])
+
+
 if __name__ == '__main__':
     unittest.main()